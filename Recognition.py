@@ -1,11 +1,77 @@
 import sys
 import cv2
-import numpy as np
-import csv
 from datetime import datetime
 from PyQt5 import QtWidgets, QtGui, QtCore
-import face_recognition
-import os
+import time
+from encoding_cache import EncodingCache
+from gallery import Gallery, MATCH_THRESHOLD
+from gallery_index import make_index
+from gallery_reload import GalleryReloader
+from pipeline import RecognitionPipeline
+from attendance_log import AttendanceWriter, EXIT
+from student_directory import StudentDirectory
+from presence import PresenceTracker, UNSEEN, EXITED
+from metrics import Metrics, MetricsServer, MetricsLogger
+from registry import REGISTRY_DB, open_registry
+from reports import ReportWindow
+
+# "exact" scans the whole gallery; "ivf" is approximate and scales to 100k+;
+# "float16" and "int8" scan a compressed copy (1/2 and 1/4 of the memory)
+# and re-rank the best candidates exactly, so matches are unchanged
+GALLERY_INDEX = "exact"
+# Extra settings for the index, e.g. {"exact_path": "gallery_exact.npy"} for
+# where a float16/int8 gallery memory-maps its float32 copy (a temporary
+# file otherwise)
+GALLERY_INDEX_OPTIONS = {}
+# How students with several enrollment photos are matched: "min", "centroid" or "vote"
+MATCH_AGGREGATION = "min"
+# Cameras to watch, as (device index or video/stream URL, FPS cap or None).
+# All of them share the recognition workers and feed one attendance record.
+CAMERA_SOURCES = [
+    (0, None),
+]
+# Detection/encoding worker processes running next to the GUI
+RECOGNITION_WORKERS = 2
+# Full detection + encoding every N frames (or when a tracked face is lost),
+# on a copy of the frame downscaled by DETECTION_SCALE
+DETECT_EVERY = 5
+DETECTION_SCALE = 0.5
+# Face detection backend: "hog" (dlib, the default), "haar"/"lbp" (OpenCV
+# cascades, cheap but frontal only), "dnn" (OpenCV's SSD detector on the
+# CPU; needs its model files, see detectors.py) or "cascade", where a cheap
+# detector finds candidate regions and an expensive one confirms them, e.g.
+# {"screen": "haar", "verify": "hog"}. benchmark.py's detectors stage
+# compares their speed and recall on your own footage.
+FACE_DETECTOR = "hog"
+FACE_DETECTOR_OPTIONS = {}
+# Skip encoding faces that are too small, blurred, badly lit or turned away,
+# and re-encode a tracked face only when a better crop of it comes along
+# (thresholds in face_quality.py)
+QUALITY_GATE = True
+# Boxes from a recognition result are drawn on frames up to this many seconds newer
+OVERLAY_TIMEOUT = 1.0
+# The preview is shown at this fraction of the capture resolution
+DISPLAY_SCALE = 1.0
+# Qt 5.14+ can display OpenCV's BGR frames as they are; older versions need
+# a conversion to RGB first (into a reused buffer)
+QIMAGE_BGR = getattr(QtGui.QImage, "Format_BGR888", None)
+# A student counts as arrived after PRESENCE_MIN_CONFIRMATIONS sightings no
+# more than PRESENCE_CONFIRM_WINDOW seconds apart, and as left after not being
+# seen for PRESENCE_EXIT_TIMEOUT seconds (None turns exits off, e.g. for a
+# camera that only watches the entrance). No student changes state more than
+# once per PRESENCE_COOLDOWN seconds.
+PRESENCE_MIN_CONFIRMATIONS = 3
+PRESENCE_CONFIRM_WINDOW = 2.0
+PRESENCE_COOLDOWN = 30.0
+PRESENCE_EXIT_TIMEOUT = 600.0
+# Stage timings and counters: served as JSON on http://127.0.0.1:METRICS_PORT/metrics
+# (None turns the endpoint off), printed every METRICS_LOG_INTERVAL seconds
+# (None turns the log line off) and shown over the video when
+# SHOW_METRICS_OVERLAY is set. F3 toggles the overlay at runtime.
+METRICS_PORT = None
+METRICS_LOG_INTERVAL = 60.0
+SHOW_METRICS_OVERLAY = False
+OVERLAY_STAGES = ["capture", "track", "detect", "quality", "encode", "match", "latency", "paint", "gui", "disk_write"]
 
 class StudentAttendanceSystem(QtWidgets.QWidget):
     def __init__(self):
@@ -13,21 +79,65 @@ class StudentAttendanceSystem(QtWidgets.QWidget):
         self.setWindowTitle("Student Attendance System")
 
         self.recognize_faces = False
-        self.student_status = {}
-        self.known_faces = []
-        self.known_names = []
-        self.video_capture = cv2.VideoCapture(0)
+        self.presence = PresenceTracker(min_confirmations=PRESENCE_MIN_CONFIRMATIONS,
+                                        confirm_window=PRESENCE_CONFIRM_WINDOW,
+                                        cooldown=PRESENCE_COOLDOWN,
+                                        exit_timeout=PRESENCE_EXIT_TIMEOUT)
+        self.gallery = Gallery(make_index(GALLERY_INDEX, **GALLERY_INDEX_OPTIONS), MATCH_AGGREGATION)
+        self.video_captures = [cv2.VideoCapture(source) for source, _ in CAMERA_SOURCES]
         self.recognized_students = set() 
+        self.encoding_cache = EncodingCache()
+        self.last_results = {}
+        # Per-source buffers the preview is scaled/converted into, reused every frame
+        self.display_buffers = {}
+        self.metrics = Metrics()
+        # Keeps every day's attendance.csv current while the app runs
+        self.attendance_writer = AttendanceWriter(metrics=self.metrics, roster=lambda: list(self.presence.names))
+        # Creates the registry store on first run, importing RegisteredStudents.csv
+        open_registry(REGISTRY_DB).close()
+        self.student_directory = StudentDirectory(REGISTRY_DB)
+        self.student_directory.start()
         
 
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.update_gui)
         self.timer.start(10)
 
-        self.load_known_students_from_csv("RegisteredStudents.csv")
-
-        self.camera_label = QtWidgets.QLabel(self)
-        self.camera_label.setGeometry(0, 0, 640, 480)
+        self.pipeline = RecognitionPipeline(self.gallery, workers=RECOGNITION_WORKERS,
+                                            threshold=MATCH_THRESHOLD, detect_every=DETECT_EVERY,
+                                            detection_scale=DETECTION_SCALE, quality_gate=QUALITY_GATE,
+                                            detector=FACE_DETECTOR, detector_options=FACE_DETECTOR_OPTIONS,
+                                            min_matches=PRESENCE_MIN_CONFIRMATIONS,
+                                            metrics=self.metrics)
+
+        # Picks up registrations made while the app is running; new photos
+        # are encoded in the pipeline's worker processes
+        self.gallery_reloader = GalleryReloader(self.gallery, REGISTRY_DB, self.encoding_cache,
+                                                self.pipeline.gallery_lock, self.pipeline.executor)
+        self.load_known_students_from_csv(REGISTRY_DB)
+        self.restore_attendance_for_today()
+        self.attendance_writer.start()
+        self.gallery_reloader.start()
+        for source_id, (video_capture, (_, max_fps)) in enumerate(zip(self.video_captures, CAMERA_SOURCES)):
+            self.pipeline.add_source(source_id, video_capture, max_fps)
+        self.pipeline.start()
+
+        self.metrics_server = None
+        if METRICS_PORT is not None:
+            self.metrics_server = MetricsServer(self.metrics, port=METRICS_PORT)
+            self.metrics_server.start()
+        self.metrics_logger = None
+        if METRICS_LOG_INTERVAL is not None:
+            self.metrics_logger = MetricsLogger(self.metrics, METRICS_LOG_INTERVAL)
+            self.metrics_logger.start()
+
+        self.camera_labels = []
+        camera_layout = QtWidgets.QHBoxLayout()
+        for _ in CAMERA_SOURCES:
+            camera_label = QtWidgets.QLabel(self)
+            camera_label.setGeometry(0, 0, 640, 480)
+            camera_layout.addWidget(camera_label)
+            self.camera_labels.append(camera_label)
 
         self.toggle_recognition_button = QtWidgets.QPushButton("Start Recognition", self)
         self.toggle_recognition_button.clicked.connect(self.toggle_face_recognition)
@@ -44,12 +154,21 @@ class StudentAttendanceSystem(QtWidgets.QWidget):
 
         self.present_students_label = QtWidgets.QLabel(self)
         self.present_students_label.setText("Present Students:")
+
+        self.metrics_label = QtWidgets.QLabel(self)
+        self.metrics_label.setFont(QtGui.QFont("Courier", 9))
+        self.metrics_label.setStyleSheet("QLabel { background-color: rgba(0, 0, 0, 160); color: white; }")
+        self.metrics_label.setVisible(SHOW_METRICS_OVERLAY)
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics_overlay)
+        self.metrics_timer.start(1000)
+        QtWidgets.QShortcut(QtGui.QKeySequence("F3"), self, self.toggle_metrics_overlay)
         
         self.absent_students_button = QtWidgets.QPushButton("Show Absent Students", self)
         self.absent_students_button.clicked.connect(self.show_absent_students)
 
         layout = QtWidgets.QVBoxLayout()
-        layout.addWidget(self.camera_label)
+        layout.addLayout(camera_layout)
         layout.addWidget(self.toggle_recognition_button)
         layout.addWidget(self.check_not_present_button)
         layout.addWidget(self.confirmation_label)
@@ -58,129 +177,192 @@ class StudentAttendanceSystem(QtWidgets.QWidget):
         self.setLayout(layout)
 
     
-    def mark_student_present(self, student_name):
-        if student_name in self.student_status and self.student_status[student_name]["exit_time"] is None:
-            # Mark the student as present
-            self.student_status[student_name]["entry_time"] = datetime.now()
+    def mark_student_present(self, student_name, seen_at=None):
+        # Every sighting goes through the presence state machine; only an
+        # actual entry or re-entry is written to the attendance log
+        seen_at = seen_at or time.time()
+        event = self.presence.observe(student_name, seen_at)
+        if event is not None:
             self.recognized_students.add(student_name) 
 
-            # Save the attendance data to the CSV file for the current day
-            self.save_attendance_for_today()
+            # Append the entry to today's attendance log (flushed in the background)
+            self.attendance_writer.record(event, student_name, datetime.fromtimestamp(seen_at))
 
             # Show a confirmation message
             # QtWidgets.QMessageBox.information(self, "Attendance Confirmation", f"{student_name} is marked present.")
 
-    def save_attendance_for_today(self):
-        # Create a folder for attendance if it doesn't exist
-        attendance_folder = "attendance"
-        if not os.path.exists(attendance_folder):
-            os.mkdir(attendance_folder)
-
-        # Get the current date as a string (e.g., "2023-10-16")
-        current_date = datetime.now().strftime("%Y-%m-%d")
-
-        # Create a subfolder for the current day if it doesn't exist
-        day_folder = os.path.join(attendance_folder, current_date)
-        if not os.path.exists(day_folder):
-            os.mkdir(day_folder)
-
-        # Define the CSV file for today's attendance
-        today_attendance_csv_file = os.path.join(day_folder, "attendance.csv")
-
-        # Write attendance data to the CSV file
-        with open(today_attendance_csv_file, "w", newline="") as csvfile:
-            fieldnames = ["Student Name", "Entry Time", "Exit Time"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for student_name, status in self.student_status.items():
-                entry_time = status["entry_time"] if status["entry_time"] else "N/A"
-                exit_time = status["exit_time"] if status["exit_time"] else "N/A"
-                writer.writerow({"Student Name": student_name, "Entry Time": entry_time, "Exit Time": exit_time})
-    
-    def add_known_student(self, image_path, student_name):
-        print(image_path)
-        image = face_recognition.load_image_file(image_path)
-        encoding = face_recognition.face_encodings(image)
-        if len(encoding) > 0:
-            face_encoding = encoding[0]
-            self.known_faces.append(face_encoding)
-            self.known_names.append(student_name)
-
-            self.student_status[student_name] = {
-            "entry_time": None,
-            "exit_time": None,
-            "last_marked_time": None
-            }
-        else:
-            print(f"No face found in the image for student '{student_name}'")
-
-    def load_known_students_from_csv(self, csv_file):
-        with open(csv_file, "r") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                image_path = row["PhotoPath"]
-                student_name = row["Name"]
-
-                self.add_known_student(image_path, student_name)
+    def restore_attendance_for_today(self):
+        # Pick up entries/exits already logged today by an earlier run
+        for student_name, (entry_time, exit_time) in self.attendance_writer.load_day().items():
+            if student_name in self.presence and entry_time is not None:
+                self.presence.restore(student_name, entry_time, exit_time)
+                self.recognized_students.add(student_name)
+
+    def mark_exited_students(self):
+        now = time.time()
+        for student_name in self.presence.sweep(now):
+            _, exit_time = self.presence.times(student_name)
+            self.attendance_writer.record(EXIT, student_name, exit_time)
+
+    def load_known_students_from_csv(self, registry_path):
+        # Loads the registry store (or a CSV in the old layout). Only photos
+        # that are new or changed since the last run get encoded, everything
+        # else comes straight out of the on-disk encoding cache. Later
+        # changes to the registry are merged in by the gallery reloader.
+        self.gallery_reloader.registry_path = registry_path
+        self.gallery_reloader.reload(force=True)
+        self.add_reloaded_students()
+
+    def add_reloaded_students(self):
+        for student_name in self.gallery_reloader.drain_added():
+            self.presence.add(student_name)
 
     def toggle_face_recognition(self):
         self.recognize_faces = not self.recognize_faces
+        self.pipeline.set_recognition(self.recognize_faces)
+        if not self.recognize_faces:
+            self.last_results = {}
 
     def get_student_info_from_csv(self, student_name):
-        with open("RegisteredStudents.csv", mode="r") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row["Name"] == student_name:
-                    return {
-                        "name": row["Name"],
-                        "course": row["Course"],
-                        "photo_path": row["PhotoPath"]
-                    }
-        return "Student not found"
+        # Served from the in-memory directory, which reloads the CSV itself
+        # whenever the file changes; None for a student it doesn't have yet
+        # (the gallery reloader may pick up a registration first)
+        return self.student_directory.get(student_name)
 
     def update_gui(self):
-        ret, frame = self.video_capture.read()
-        if ret:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
+        # Capture, detection and encoding run in the pipeline's threads and
+        # worker processes; the GUI thread only applies finished results and
+        # paints the most recent frame.
+        with self.metrics.timer("gui"):
+            self._update_gui()
+
+    def _update_gui(self):
+        self.add_reloaded_students()
+        for result in self.pipeline.result_queue.drain():
+            # Frames still in flight when recognition was switched off
             if self.recognize_faces:
-                face_locations = face_recognition.face_locations(rgb_frame)
-                face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-                for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                    distances = face_recognition.face_distance(self.known_faces, face_encoding)
-
-                    min_dist = np.min(distances)
-                    if min_dist >= 0.3:
-                        name = "Unknown"
-                    else:
-                        index = np.argmin(distances)
-                        name = self.known_names[index]
-
-                    if name != "Unknown":
-                        student_info = self.get_student_info_from_csv(name)
-                        self.display_student_info(student_info, top, right, bottom, left)
-                        # Mark the recognized student as present and save attendance data
-                        self.mark_student_present(name)
-
-                        # Display the student's information and the green frame
-                        student_info = self.get_student_info_from_csv(name)
-                        self.display_student_info(student_info, top, right, bottom, left)
-                        self.adjust_face_frame(top, right, bottom, left)
-                    else:
-                        self.display_unrecognized_student()
-
-            height, width, channel = rgb_frame.shape
-            bytes_per_line = 3 * width
-            q_img = QtGui.QImage(rgb_frame.data, width, height, bytes_per_line, QtGui.QImage.Format_RGB888)
-            pixmap = QtGui.QPixmap.fromImage(q_img)
-            self.camera_label.setPixmap(pixmap)
+                self.handle_recognition_result(result)
+        if self.recognize_faces:
+            self.mark_exited_students()
+
+        for source, camera_label in zip(self.pipeline.sources, self.camera_labels):
+            frame = source.preview_queue.get_nowait()
+            if frame is not None:
+                with self.metrics.timer("paint"):
+                    self.paint_frame(frame, camera_label)
+
+    def toggle_metrics_overlay(self):
+        self.metrics_label.setVisible(not self.metrics_label.isVisible())
+        self.update_metrics_overlay()
+
+    def update_metrics_overlay(self):
+        if not self.metrics_label.isVisible():
+            return
+        snapshot = self.metrics.snapshot()
+        stages = snapshot["stages"]
+        counters = snapshot["counters"]
+
+        def fps(stage):
+            rate = stages.get(stage, {}).get("rate_per_s")
+            return f"{rate:5.1f}" if rate else "    -"
+
+        lines = [f"display {fps('paint')} fps   capture {fps('capture')} fps   detect {fps('detect')} /s"]
+        for stage in OVERLAY_STAGES:
+            summary = stages.get(stage)
+            if summary and summary["count"]:
+                lines.append(f"{stage:<10} p50 {summary['p50_ms']:7.1f} ms  p95 {summary['p95_ms']:7.1f} ms")
+        lines.append(f"dropped {counters.get('frames_dropped', 0)}  faces {counters.get('faces_detected', 0)}  "
+                     f"rejected {counters.get('faces_rejected', 0)}  matched {counters.get('matches', 0)}  unknown {counters.get('unknowns', 0)}  "
+                     f"disk writes {counters.get('disk_writes', 0)}")
+        self.metrics_label.setText("\n".join(lines))
+        self.metrics_label.adjustSize()
+        self.metrics_label.move(10, 10)
+        self.metrics_label.raise_()
+
+    def paint_frame(self, frame, camera_label):
+        # The QImage wraps the frame's pixels without copying them; the only
+        # copies are the optional downscale and RGB conversion (into reused
+        # buffers) and the upload into the QPixmap. Boxes are painted on the
+        # pixmap, never on the frame, whose buffer the pipeline shares.
+        image = frame.image
+        scaled, rgb = self.display_buffers.get(frame.source_id, (None, None))
+        if DISPLAY_SCALE != 1.0:
+            scaled = cv2.resize(image, None, dst=scaled, fx=DISPLAY_SCALE, fy=DISPLAY_SCALE,
+                                interpolation=cv2.INTER_AREA)
+            image = scaled
+        if QIMAGE_BGR is None:
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb)
+            image = rgb
+        self.display_buffers[frame.source_id] = (scaled, rgb)
+
+        height, width, channel = image.shape
+        q_img = QtGui.QImage(image.data, width, height, image.strides[0],
+                             QIMAGE_BGR if QIMAGE_BGR is not None else QtGui.QImage.Format_RGB888)
+        pixmap = QtGui.QPixmap.fromImage(q_img)
+
+        last_result = self.last_results.get(frame.source_id)
+        if last_result is not None and frame.timestamp - last_result.timestamp < OVERLAY_TIMEOUT:
+            painter = QtGui.QPainter(pixmap)
+            for (top, right, bottom, left), name in last_result.faces:
+                # A name of None is a face not recognised yet (e.g. held back
+                # by the quality gate), neither a match nor a stranger
+                if name is None:
+                    colour = QtCore.Qt.yellow
+                else:
+                    colour = QtCore.Qt.green if name != "Unknown" else QtCore.Qt.red
+                painter.setPen(QtGui.QPen(colour, 2))
+                painter.drawRect(QtCore.QRectF(left * DISPLAY_SCALE, top * DISPLAY_SCALE,
+                                               (right - left) * DISPLAY_SCALE, (bottom - top) * DISPLAY_SCALE))
+            painter.end()
+        camera_label.setPixmap(pixmap)
+
+    def handle_recognition_result(self, result):
+        self.last_results[result.source_id] = result
+        for ((top, right, bottom, left), name), fresh in zip(result.faces, result.fresh):
+            if name is None:
+                # Not recognised yet; wait for a usable crop
+                continue
+            if name != "Unknown":
+                if fresh:
+                    # Mark the recognized student as present and save attendance data
+                    self.mark_student_present(name, result.timestamp)
+                else:
+                    # Carried over by the tracker: still here, but not a new confirmation
+                    self.presence.seen(name, result.timestamp)
+
+                # Display the student's information and the green frame
+                student_info = self.get_student_info_from_csv(name)
+                if student_info is None:
+                    self.display_student_name(name, top, right, bottom, left)
+                else:
+                    self.display_student_info(student_info, top, right, bottom, left)
+                self.adjust_face_frame(top, right, bottom, left)
+            else:
+                self.display_unrecognized_student()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.metrics_timer.stop()
+        self.gallery_reloader.stop()
+        self.pipeline.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.metrics_logger is not None:
+            self.metrics_logger.stop()
+        for video_capture in self.video_captures:
+            video_capture.release()
+        self.attendance_writer.close(self.presence.names)
+        self.student_directory.stop()
+        super().closeEvent(event)
 
     def display_student_info(self, student_info, top, right, bottom, left):
         self.confirmation_label.setText(f"Name: {student_info['name']}, Course: {student_info['course']}")
         self.adjust_face_frame(top, right, bottom, left)
 
+    def display_student_name(self, student_name, top, right, bottom, left):
+        self.confirmation_label.setText(f"Name: {student_name}")
+        self.adjust_face_frame(top, right, bottom, left)
+
     def display_unrecognized_student(self):
         self.confirmation_label.setText("Unrecognized Student")
         self.face_frame_label.setGeometry(0, 0, 0, 0)
@@ -191,76 +373,18 @@ class StudentAttendanceSystem(QtWidgets.QWidget):
         self.face_frame_label.setGeometry(left, top, face_width, face_height)
 
     def check_not_present_students(self):
-        not_present_students = []
-        for student_name, status_info in self.student_status.items():
-            if status_info["exit_time"] is None:
-                not_present_students.append(student_name)
-        if not_present_students:
-            self.display_not_present_students(not_present_students)
+        self.open_report("Not Present Today", UNSEEN)
 
-    def display_not_present_students(self, not_present_students):
-        not_present_window = QtWidgets.QWidget()
-        not_present_window.setWindowTitle("Not Present Today")
-
-        layout = QtWidgets.QVBoxLayout()
-        not_present_label = QtWidgets.QLabel("Students Not Present Today:")
-        layout.addWidget(not_present_label)
-
-        for student_name in not_present_students:
-            not_present_info = self.get_student_info_from_csv(student_name)
-            not_present_info_label = QtWidgets.QLabel(f"Name: {student_name}, Course: {not_present_info['course']}")
-            layout.addWidget(not_present_info_label)
+    def show_absent_students(self):
+        self.open_report("Absent Students", EXITED)
 
-        not_present_window.setLayout(layout)
-        not_present_window.show()
+    def open_report(self, title, state):
+        # The GUI thread only copies the presence arrays; the report itself
+        # is built on a worker thread and shown in a lazily filled table
+        report_window = ReportWindow(title, self.presence.snapshot(), self.student_directory, state, self)
+        report_window.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        report_window.show()
 
-    def show_absent_students(self):
-        absent_students = []
-        absent_students_info = [] 
-        for student_name, status_info in self.student_status.items():
-            if status_info["exit_time"] is not None:
-                absent_students.append(student_name)
-    # Define the list here
-
-        if not absent_students:
-            QtWidgets.QMessageBox.information(self, "Absent Students", "All students are present today.")
-        else:
-            for student_name in absent_students:
-                student_info = self.get_student_info_from_csv(student_name)
-                student_info_str = f"Name: {student_name}, Course: {student_info['course']}"
-                absent_students_info.append(student_info_str)
-
-        absent_students_message = "\n".join(absent_students_info)
-        QtWidgets.QMessageBox.information(self, "Absent Students", f"Absent Students:\n{absent_students_message}")
-
-
-def save_attendance_for_today(student_status):
-    # Create a folder for attendance if it doesn't exist
-    attendance_folder = "attendance"
-    if not os.path.exists(attendance_folder):
-        os.mkdir(attendance_folder)
-
-    # Get the current date as a string (e.g., "2023-10-16")
-    current_date = datetime.now().strftime("%Y-%m-%d")
-
-    # Create a subfolder for the current day if it doesn't exist
-    day_folder = os.path.join(attendance_folder, current_date)
-    if not os.path.exists(day_folder):
-        os.mkdir(day_folder)
-
-    # Define the CSV file for today's attendance
-    today_attendance_csv_file = os.path.join(day_folder, "attendance.csv")
-
-    # Write attendance data to the CSV file
-    with open(today_attendance_csv_file, "w", newline="") as csvfile:
-        fieldnames = ["Student Name", "Entry Time", "Exit Time"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for student_name, status in student_status.items():
-            entry_time = status["entry_time"] if status["entry_time"] else "N/A"
-            exit_time = status["exit_time"] if status["exit_time"] else "N/A"
-            writer.writerow({"Student Name": student_name, "Entry Time": entry_time, "Exit Time": exit_time})
 
 def main():
     app = QtWidgets.QApplication(sys.argv)
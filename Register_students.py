@@ -1,11 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
-from PIL import Image, ImageTk
-import csv
 import os
 import cv2
 import uuid
+import time
+from face_quality import enrollment_problem
+from registry import DuplicateStudentError, open_registry, join_photo_paths, split_photo_paths
 
 # Create a dictionary to store registered student data
 students_info = {}
@@ -15,8 +16,10 @@ csv_directory = "C:/Users/DELL/Desktop/Holiday school projects/"
 # Specify the directory where you want to save student photos
 photo_directory = "C:/Users/DELL/Desktop/Holiday school projects/student_photos/"
 
-# Specify the full path to the CSV file
+# Specify the full path to the CSV file (only read to seed the registry store)
 csv_file_path = os.path.join(csv_directory, "RegisteredStudents.csv")
+# The registry store the recognition app reads from as well
+registry_db_path = os.path.join(csv_directory, "RegisteredStudents.db")
 
 # Create the directory if it doesn't exist
 if not os.path.exists(csv_directory):
@@ -26,52 +29,67 @@ if not os.path.exists(csv_directory):
 if not os.path.exists(photo_directory):
     os.makedirs(photo_directory)
 
-# Load existing student data from the CSV file
-if os.path.exists(csv_file_path):
-    with open(csv_file_path, "r") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            student_id = int(row["ID"])
-            students_info[student_id] = {
-                "name": row["Name"],
-                "course": row["Course"],
-                "cohort": row["Cohort"],
-                "photo_path": row["PhotoPath"],
-            }
-
-# Determine the next available student ID
-next_student_id = len(students_info) + 1
-
-# Function to save registered students to the CSV file
-def save_registered_students_to_csv():
-    with open(csv_file_path, "w", newline="") as csvfile:
-        fieldnames = ["ID", "Name", "Course", "Cohort", "PhotoPath"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        writer.writeheader()
-
-        # Write each student's information
-        for student_id, student_info in students_info.items():
-            writer.writerow({
-                "ID": student_id,
-                "Name": student_info["name"],
-                "Course": student_info["course"],
-                "Cohort": student_info["cohort"],
-                "PhotoPath": student_info["photo_path"],
-            })
+# Open the registry store (importing the CSV the first time) and load existing student data
+registry_store = open_registry(registry_db_path, csv_file_path)
+students_info.update(registry_store.students())
+
+# Number of frames captured per "Capture Image" click, and the pause between them,
+# so every student is enrolled with several slightly different photos
+burst_size = 5
+burst_interval = 0.2
+
+# The live camera preview is shown at this fraction of the capture resolution
+preview_scale = 1.0
+
+# Show a BGR frame through Tk's own PPM reader instead of a PIL round-trip;
+# an existing PhotoImage is updated in place rather than replaced every frame.
+# This is as close to zero-copy as Tk gets: a PhotoImage can't wrap an
+# outside buffer and only takes encoded image data or per-pixel put()
+# strings, so the frame is copied once into the PPM (which also swaps BGR to
+# RGB) and once more by Tk. Keep the preview small to keep that cheap.
+def frame_to_photo(frame, photo=None):
+    ok, ppm = cv2.imencode(".ppm", frame)
+    if photo is None:
+        return tk.PhotoImage(data=ppm.tobytes(), format="PPM")
+    photo.configure(data=ppm.tobytes(), format="PPM")
+    return photo
+
+# Thumbnail of a photo on disk for the registration form, or None if OpenCV can't read it
+def thumbnail_photo(image_path, max_size=150):
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = min(1.0, max_size / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return frame_to_photo(image)
+
+def show_thumbnail(image_path):
+    photo = thumbnail_photo(image_path)
+    photo_label.config(image=photo if photo is not None else "")
+    photo_label.image = photo
 
 # Function to open the camera feed
 def open_camera():
     def capture_image():
         nonlocal capturing
         capturing = True
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
 
-        if ret:
-            # Generate a unique student ID
-            global next_student_id
+        # Capture a burst of frames from the open camera feed, keeping only
+        # those with one clear, well lit face looking at the camera
+        photo_save_paths = []
+        problems = []
+        for shot in range(burst_size):
+            if shot:
+                time.sleep(burst_interval)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            problem = enrollment_problem(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if problem:
+                problems.append(problem)
+                continue
 
             # Create a unique photo name (e.g., using UUID)
             unique_photo_name = str(uuid.uuid4()) + ".jpg"
@@ -79,31 +97,38 @@ def open_camera():
 
             # Save the captured image
             cv2.imwrite(photo_save_path, frame)
+            photo_save_paths.append(photo_save_path)
+
+        if photo_save_paths:
+            cap.release()
 
-            # Display the captured image in the GUI
-            image = Image.open(photo_save_path)
-            image.thumbnail((150, 150))
-            photo = ImageTk.PhotoImage(image)
-            photo_label.config(image=photo)
-            photo_label.image = photo
-            photo_path_label.config(text=photo_save_path)
+            # Display the first captured image in the GUI
+            show_thumbnail(photo_save_paths[0])
+            photo_path_label.config(text=join_photo_paths(photo_save_paths))
 
             # Show a success message in green
-            error_label.config(text="Image captured successfully.", foreground="green")
+            error_label.config(text=f"{len(photo_save_paths)} images captured successfully.", foreground="green")
 
             # Close the camera window
             camera_window.destroy()
-
-        if not capturing:
-            update_camera_feed()  # Restart the camera feed
+        else:
+            if problems:
+                error_label.config(text=f"No usable photo ({max(set(problems), key=problems.count)}), please try again.",
+                                   foreground="red")
+            # The feed's pending after() callback picks up again from here
+            capturing = False
 
     def update_camera_feed():
         if not capturing:
-            ret, frame = cap.read()
+            nonlocal camera_frame, preview
+            ret, camera_frame = cap.read(camera_frame)
             if ret:
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(image)
-                photo = ImageTk.PhotoImage(image)
+                image = camera_frame
+                if preview_scale != 1.0:
+                    preview = cv2.resize(camera_frame, None, dst=preview, fx=preview_scale, fy=preview_scale,
+                                         interpolation=cv2.INTER_AREA)
+                    image = preview
+                photo = frame_to_photo(image, camera_label.photo)
 
                 camera_label.config(image=photo)
                 camera_label.photo = photo
@@ -111,6 +136,9 @@ def open_camera():
                 camera_window.after(10, update_camera_feed)  # Update the camera feed every 10 milliseconds
 
     capturing = False
+    # Reused from frame to frame by cap.read and cv2.resize
+    camera_frame = None
+    preview = None
 
     camera_window = tk.Toplevel()
     camera_window.title("Camera Feed")
@@ -118,6 +146,7 @@ def open_camera():
     cap = cv2.VideoCapture(0)
 
     camera_label = ttk.Label(camera_window)
+    camera_label.photo = None
     camera_label.pack()
 
     capture_button = ttk.Button(camera_window, text="Capture Image", command=capture_image)
@@ -140,32 +169,30 @@ def register_student():
         return
 
     # Check if a student with the same name, course, and cohort already exists
-    for student_id, student_info in students_info.items():
-        if (
-            student_info["name"] == name
-            and student_info["course"] == course
-            and student_info["cohort"] == cohort
-        ):
-            error_label.config(text="Student with the same credentials already exists.")
-            return
+    if registry_store.find(name, course, cohort) is not None:
+        error_label.config(text="Student with the same credentials already exists.")
+        return
 
-    # Generate a unique student ID
-    global next_student_id
+    # Save the student photos in the student_photos directory
+    for path in split_photo_paths(photo_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    # Save the student photo in the student_photos directory
-    os.makedirs(os.path.dirname(photo_path), exist_ok=True)
+    # Insert the student into the registry store, which assigns a unique student ID
+    try:
+        student_id = registry_store.add_student(name, course, cohort, photo_path)
+    except DuplicateStudentError:
+        # Registered from another window or app since the check above
+        error_label.config(text="Student with the same credentials already exists.")
+        return
 
     # Store student data in the dictionary
-    students_info[next_student_id] = {
+    students_info[student_id] = {
         "name": name,
         "course": course,
         "cohort": cohort,
         "photo_path": photo_path,
     }
 
-    # Save the registered students to the CSV file
-    save_registered_students_to_csv()
-
     # Clear the form fields
     name_var.set("")  # Clear the "Name" field
     cohort_var.set("")  # Clear the "Cohort" field
@@ -175,17 +202,13 @@ def register_student():
     # Show a success message in green
     error_label.config(text="Student registered successfully.", foreground="green")
 
-# Function to browse and select a photo
+# Function to browse and select one or more photos
 def browse_photo():
-    file_path = filedialog.askopenfilename()
-    if file_path:
-        # Display the selected image in the UI
-        image = Image.open(file_path)
-        image.thumbnail((150, 150))
-        photo = ImageTk.PhotoImage(image)
-        photo_label.config(image=photo)
-        photo_label.image = photo
-        photo_path_label.config(text=file_path)
+    file_paths = filedialog.askopenfilenames()
+    if file_paths:
+        # Display the first selected image in the UI
+        show_thumbnail(file_paths[0])
+        photo_path_label.config(text=join_photo_paths(file_paths))
 
 def display_registered_students():
     registered_students_window = tk.Toplevel()
@@ -273,6 +296,7 @@ error_label.grid(column=0, row=9, columnspan=2)
 
 # Start the application
 root.mainloop()
+registry_store.close()
 
 
 
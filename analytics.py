@@ -0,0 +1,394 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from attendance_log import ATTENDANCE_FILE, ATTENDANCE_FOLDER, EVENTS_FILE, fold_events, read_events
+from registry import REGISTRY_DB
+from student_directory import StudentDirectory
+
+DEFAULT_STORE_DIR = "analytics_store"
+# Arriving after this time of day counts as late
+LATE_AFTER = "09:00"
+# Seconds since midnight of a missing entry/exit time
+MISSING = -1
+COLUMNS = ("day", "student", "entry", "exit")
+GROUP_BY = ("student", "course", "cohort")
+
+
+def day_number(day):
+    # day is a date/datetime or a "YYYY-MM-DD" string
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.toordinal()
+
+
+def seconds_of_day(value):
+    # "HH:MM[:SS]" or a datetime/time, as seconds since midnight
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%H:%M:%S" if value.count(":") == 2 else "%H:%M")
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _parse_time(value):
+    if not value or value == "N/A":
+        return MISSING
+    try:
+        return seconds_of_day(datetime.fromisoformat(value))
+    except ValueError:
+        return MISSING
+
+
+def read_attendance_sheet(path):
+    # [(student name, entry seconds, exit seconds), ...] from one day's attendance.csv
+    rows = []
+    with open(path, "r", newline="") as csvfile:
+        for row in csv.DictReader(csvfile):
+            student_name = row.get("Student Name")
+            if student_name:
+                rows.append((student_name, _parse_time(row.get("Entry Time")), _parse_time(row.get("Exit Time"))))
+    return rows
+
+
+def read_day_events(path, roster=()):
+    # The same rows folded from a day's events.csv, for days whose sheet
+    # hasn't been written yet (e.g. the attendance app crashed). Like the
+    # sheet compaction would, everyone on `roster` without an event gets an
+    # absent row.
+    state = fold_events(read_events(path))
+    rows = [(student_name,
+             seconds_of_day(entry_time) if entry_time else MISSING,
+             seconds_of_day(exit_time) if exit_time else MISSING)
+            for student_name, (entry_time, exit_time) in state.items()]
+    rows.extend((student_name, MISSING, MISSING) for student_name in roster if student_name not in state)
+    return rows
+
+
+class AttendanceAnalytics:
+    # Columnar store of every per-day attendance sheet: one row per student
+    # per day, held in day.npy (date ordinal), student.npy (index into the
+    # student names in index.json), entry.npy and exit.npy (seconds since
+    # midnight, MISSING for N/A), all memory-mapped on load and kept sorted
+    # by day so a date range is two binary searches. order.npy holds the
+    # rows sorted by student, then day, for streaks.
+    #
+    # index.json also records the mtime and size each day's sheet had when
+    # it was read, so ingest() only parses sheets that are new or changed
+    # since the last run; everything else is copied from the old columns.
+    # A day without a sheet is read from its events.csv instead, until the
+    # sheet appears.
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, attendance_folder=ATTENDANCE_FOLDER,
+                 registry_path=REGISTRY_DB, directory=None):
+        self.store_dir = store_dir
+        self.attendance_folder = attendance_folder
+        self.registry_path = registry_path
+        self.directory = directory
+        self.index_path = os.path.join(store_dir, "index.json")
+        self.students = []
+        self.days = {}
+        self.columns = self._empty_columns()
+        self.load()
+
+    def _column_path(self, name):
+        return os.path.join(self.store_dir, f"{name}.npy")
+
+    def _empty_columns(self):
+        columns = {name: np.zeros(0, dtype=np.int32) for name in COLUMNS}
+        columns["order"] = np.zeros(0, dtype=np.int64)
+        return columns
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            columns = {name: np.load(self._column_path(name), mmap_mode="r") for name in COLUMNS + ("order",)}
+        except (OSError, ValueError):
+            print(f"Analytics store in '{self.store_dir}' is unreadable, rebuilding")
+            return
+        rows = sum(day["rows"] for day in index["days"].values())
+        if any(len(column) != rows for column in columns.values()):
+            print(f"Analytics store in '{self.store_dir}' is inconsistent, rebuilding")
+            return
+        self.students = index["students"]
+        self.days = index["days"]
+        self.columns = columns
+
+    def save(self, columns, students, days):
+        os.makedirs(self.store_dir, exist_ok=True)
+        # Same swap-in as the encoding cache: every file is written next to
+        # its final name first, and index.json goes last
+        for name, column in columns.items():
+            with open(self._column_path(name) + ".tmp", "wb") as f:
+                np.save(f, column)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(self.index_path + ".tmp", "w") as f:
+            json.dump({"students": students, "days": days}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Drop our memory maps first; Windows refuses to replace a mapped file
+        self.columns = self._empty_columns()
+        for name in columns:
+            os.replace(self._column_path(name) + ".tmp", self._column_path(name))
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self.students = students
+        self.days = days
+        self.columns = {name: np.load(self._column_path(name), mmap_mode="r") for name in columns}
+
+    def _day_sheets(self):
+        # "YYYY-MM-DD" -> (path, os.stat_result) of its attendance.csv, or of
+        # its events.csv when the day has no sheet
+        sheets = {}
+        if not os.path.isdir(self.attendance_folder):
+            return sheets
+        for entry in os.scandir(self.attendance_folder):
+            try:
+                day_number(entry.name)
+            except ValueError:
+                continue
+            for file_name in (ATTENDANCE_FILE, EVENTS_FILE):
+                path = os.path.join(entry.path, file_name)
+                try:
+                    sheets[entry.name] = (path, os.stat(path))
+                    break
+                except OSError:
+                    continue
+        return sheets
+
+    def ingest(self):
+        # Brings the store in line with the attendance folder; returns the
+        # number of day sheets (parsed, dropped).
+        sheets = self._day_sheets()
+        changed = [day for day, (_, stat) in sheets.items()
+                   if day not in self.days or (self.days[day]["mtime"], self.days[day]["size"]) != (stat.st_mtime, stat.st_size)]
+        if not changed and set(self.days) == set(sheets):
+            return 0, 0
+
+        # Where each stored day's rows start; the columns are in day order
+        offsets = {}
+        start = 0
+        for day in sorted(self.days):
+            offsets[day] = start
+            start += self.days[day]["rows"]
+
+        students = list(self.students)
+        student_index = {name: i for i, name in enumerate(students)}
+        # Sheets first, so days read from their events know who else was
+        # expected: everyone on a sheet or in the registry
+        read = {}
+        for day in changed:
+            path, _ = sheets[day]
+            if os.path.basename(path) == EVENTS_FILE:
+                continue
+            try:
+                read[day] = read_attendance_sheet(path)
+            except (OSError, csv.Error) as e:
+                print(f"Could not read the attendance sheet for {day}: {e}")
+        roster = list(dict.fromkeys(students + [name for sheet in read.values() for name, _, _ in sheet]
+                                    + list(self._directory().by_name)))
+        for day in changed:
+            path, _ = sheets[day]
+            if os.path.basename(path) == EVENTS_FILE:
+                try:
+                    read[day] = read_day_events(path, roster)
+                except OSError as e:
+                    print(f"Could not read the attendance events for {day}: {e}")
+
+        days = {}
+        parts = []
+        parsed = 0
+        for day in sorted(sheets):
+            path, stat = sheets[day]
+            old = self.days.get(day)
+            if old is not None and (old["mtime"], old["size"]) == (stat.st_mtime, stat.st_size):
+                rows = slice(offsets[day], offsets[day] + old["rows"])
+                parts.append(tuple(np.asarray(self.columns[name][rows]) for name in COLUMNS))
+                days[day] = old
+                continue
+            sheet = read.get(day)
+            if sheet is None:
+                continue
+            for student_name, _, _ in sheet:
+                if student_name not in student_index:
+                    student_index[student_name] = len(students)
+                    students.append(student_name)
+            parts.append((
+                np.full(len(sheet), day_number(day), dtype=np.int32),
+                np.array([student_index[name] for name, _, _ in sheet], dtype=np.int32),
+                np.array([entry_time for _, entry_time, _ in sheet], dtype=np.int32),
+                np.array([exit_time for _, _, exit_time in sheet], dtype=np.int32),
+            ))
+            days[day] = {"mtime": stat.st_mtime, "size": stat.st_size, "rows": len(sheet)}
+            parsed += 1
+        dropped = len(set(self.days) - set(days))
+
+        columns = {}
+        for i, name in enumerate(COLUMNS):
+            columns[name] = np.concatenate([part[i] for part in parts]) if parts else np.zeros(0, dtype=np.int32)
+        # Rows are already in day order, so a stable sort on student keeps
+        # each student's days in order
+        columns["order"] = np.argsort(columns["student"], kind="stable")
+        self.save(columns, students, days)
+        return parsed, dropped
+
+    def _range(self, start=None, end=None):
+        # Slice of the rows from day `start` to day `end`, both inclusive
+        # (searching with an int32 key keeps numpy from casting the whole column)
+        column = self.columns["day"]
+        lo = 0 if start is None else int(np.searchsorted(column, np.int32(day_number(start)), "left"))
+        hi = len(column) if end is None else int(np.searchsorted(column, np.int32(day_number(end)), "right"))
+        return slice(lo, max(lo, hi))
+
+    def _directory(self):
+        if self.directory is None:
+            self.directory = StudentDirectory(self.registry_path)
+        return self.directory
+
+    def _groups(self, by):
+        # (group labels, group of every student index)
+        if by not in GROUP_BY:
+            raise ValueError(f"Can't group attendance by '{by}'")
+        if by == "student":
+            return list(self.students), np.arange(len(self.students))
+        values = []
+        for student_name in self.students:
+            info = self._directory().get(student_name)
+            values.append(info[by] if info else "")
+        labels = sorted(set(values))
+        label_index = {label: i for i, label in enumerate(labels)}
+        return labels, np.array([label_index[value] for value in values], dtype=np.int64)
+
+    def _student_mask(self, course=None, cohort=None):
+        mask = np.ones(len(self.students), dtype=bool)
+        for by, value in (("course", course), ("cohort", cohort)):
+            if value is not None:
+                labels, group = self._groups(by)
+                mask &= group == (labels.index(value) if value in labels else -1)
+        return mask
+
+    def attendance_rates(self, start=None, end=None, by="student"):
+        # {student/course/cohort: {"days", "present", "rate"}} over the days
+        # the student was on the attendance sheet
+        labels, group = self._groups(by)
+        rows = self._range(start, end)
+        row_group = group[self.columns["student"][rows]]
+        present = self.columns["entry"][rows] != MISSING
+        days = np.bincount(row_group, minlength=len(labels))
+        attended = np.bincount(row_group, weights=present, minlength=len(labels))
+        return {
+            labels[i]: {"days": int(days[i]), "present": int(attended[i]), "rate": float(attended[i] / days[i])}
+            for i in np.flatnonzero(days)
+        }
+
+    def lateness(self, start=None, end=None, by="student", late_after=LATE_AFTER):
+        # {student/course/cohort: {"present", "late", "late_rate",
+        # "mean_minutes_late"}} over the days the student turned up
+        labels, group = self._groups(by)
+        rows = self._range(start, end)
+        entry = np.asarray(self.columns["entry"][rows])
+        present = entry != MISSING
+        row_group = group[self.columns["student"][rows][present]]
+        minutes_late = (entry[present] - seconds_of_day(late_after)) / 60
+        late = minutes_late > 0
+        attended = np.bincount(row_group, minlength=len(labels))
+        late_days = np.bincount(row_group, weights=late, minlength=len(labels))
+        late_minutes = np.bincount(row_group, weights=np.where(late, minutes_late, 0), minlength=len(labels))
+        return {
+            labels[i]: {
+                "present": int(attended[i]),
+                "late": int(late_days[i]),
+                "late_rate": float(late_days[i] / attended[i]),
+                "mean_minutes_late": float(late_minutes[i] / late_days[i]) if late_days[i] else 0.0,
+            }
+            for i in np.flatnonzero(attended)
+        }
+
+    def streaks(self, start=None, end=None, course=None, cohort=None):
+        # {student: {"current", "longest"}}: runs of consecutive sheet days
+        # the student attended, "current" being the run that reaches the
+        # last day of the range
+        order = np.asarray(self.columns["order"])
+        day = self.columns["day"][order]
+        keep = np.ones(len(order), dtype=bool)
+        if start is not None:
+            keep &= day >= day_number(start)
+        if end is not None:
+            keep &= day <= day_number(end)
+        if course is not None or cohort is not None:
+            keep &= self._student_mask(course, cohort)[self.columns["student"][order]]
+        rows = order[keep]
+        if not len(rows):
+            return {}
+        student = self.columns["student"][rows]
+        present = self.columns["entry"][rows] != MISSING
+
+        # Split the rows into runs of one student with the same presence
+        starts = np.flatnonzero(np.concatenate(([True], (student[1:] != student[:-1]) | (present[1:] != present[:-1]))))
+        lengths = np.diff(np.append(starts, len(rows)))
+        run_student = student[starts]
+        run_present = present[starts]
+        longest = np.zeros(len(self.students), dtype=np.int64)
+        np.maximum.at(longest, run_student[run_present], lengths[run_present])
+        # The last run of every student
+        last = np.flatnonzero(np.append(run_student[1:] != run_student[:-1], True))
+        current = np.zeros(len(self.students), dtype=np.int64)
+        current[run_student[last]] = np.where(run_present[last], lengths[last], 0)
+        return {
+            self.students[i]: {"current": int(current[i]), "longest": int(longest[i])}
+            for i in np.unique(run_student)
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance rates, lateness and streaks over the daily attendance sheets")
+    parser.add_argument("command", choices=["ingest", "rates", "lateness", "streaks"])
+    parser.add_argument("--from", dest="start", help="first day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--to", dest="end", help="last day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--by", choices=GROUP_BY, default="student")
+    parser.add_argument("--course", help="streaks: only students of this course")
+    parser.add_argument("--cohort", help="streaks: only students of this cohort")
+    parser.add_argument("--late-after", default=LATE_AFTER, help="lateness: start of the day (HH:MM)")
+    parser.add_argument("--attendance-folder", default=ATTENDANCE_FOLDER)
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--registry", default=REGISTRY_DB, help="registry store (.db) or registered students CSV")
+    args = parser.parse_args(argv)
+
+    analytics = AttendanceAnalytics(args.store_dir, args.attendance_folder, args.registry)
+    started = time.perf_counter()
+    parsed, dropped = analytics.ingest()
+    if args.command == "ingest":
+        print(f"{parsed} day(s) ingested, {dropped} dropped, {len(analytics.days)} in '{args.store_dir}' "
+              f"({time.perf_counter() - started:.2f}s)")
+        return 0
+
+    started = time.perf_counter()
+    if args.command == "rates":
+        results = analytics.attendance_rates(args.start, args.end, args.by)
+        lines = [f"{key}: {value['present']}/{value['days']} days ({value['rate']:.0%})"
+                 for key, value in results.items()]
+    elif args.command == "lateness":
+        results = analytics.lateness(args.start, args.end, args.by, args.late_after)
+        lines = [f"{key}: late {value['late']}/{value['present']} days ({value['late_rate']:.0%}), "
+                 f"{value['mean_minutes_late']:.1f} min on average" for key, value in results.items()]
+    else:
+        results = analytics.streaks(args.start, args.end, args.course, args.cohort)
+        lines = [f"{key}: current {value['current']} days, longest {value['longest']} days"
+                 for key, value in results.items()]
+    elapsed = time.perf_counter() - started
+    for line in lines:
+        print(line)
+    print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import Metrics
+
+ATTENDANCE_FOLDER = "attendance"
+EVENTS_FILE = "events.csv"
+ATTENDANCE_FILE = "attendance.csv"
+ATTENDANCE_FIELDS = ["Student Name", "Entry Time", "Exit Time"]
+
+ENTRY = "entry"
+EXIT = "exit"
+REENTRY = "reentry"
+
+
+def day_folder(day, attendance_folder=ATTENDANCE_FOLDER):
+    # day is a date/datetime or an already formatted "YYYY-MM-DD" string
+    if not isinstance(day, str):
+        day = day.strftime("%Y-%m-%d")
+    return os.path.join(attendance_folder, day)
+
+
+def _fsync_directory(path):
+    # Makes a rename durable on POSIX; directories can't be opened on Windows
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_attendance_csv(path, rows):
+    # rows: (student name, entry time, exit time), times may be None.
+    # Written to a temporary file, fsynced and renamed over the old one so a
+    # reader or a crash never sees a half-written attendance sheet.
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=ATTENDANCE_FIELDS)
+        writer.writeheader()
+        for student_name, entry_time, exit_time in rows:
+            writer.writerow({
+                "Student Name": student_name,
+                "Entry Time": entry_time if entry_time else "N/A",
+                "Exit Time": exit_time if exit_time else "N/A",
+            })
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(folder)
+
+
+def read_events(path):
+    # [(datetime, event, student name), ...]; a torn last line left by a
+    # crash mid-append is skipped.
+    events = []
+    if not os.path.exists(path):
+        return events
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) != 3:
+                continue
+            try:
+                events.append((datetime.fromisoformat(row[0]), row[1], row[2]))
+            except ValueError:
+                continue
+    return events
+
+
+def fold_events(events):
+    # Per student: first entry of the day, and the last exit if the student
+    # hasn't come back in since.
+    state = {}
+    for when, event, student_name in events:
+        entry_time, exit_time = state.get(student_name, (None, None))
+        if event in (ENTRY, REENTRY):
+            state[student_name] = (entry_time or when, None)
+        elif event == EXIT:
+            state[student_name] = (entry_time, when)
+    return state
+
+
+class AttendanceWriter:
+    # Append-only attendance log. Only state changes (entry, exit, re-entry)
+    # are recorded; they are buffered in memory and appended to
+    # attendance/<date>/events.csv by a background flush every
+    # `flush_interval` seconds and on close(). compact() folds a day's log
+    # into the per-day attendance.csv sheet.
+    #
+    # With `roster` (a callable returning the names every sheet lists) the
+    # flush thread also re-compacts every day that got new events, every
+    # `compact_interval` seconds and as soon as the date changes, so each
+    # day's sheet stays current on a kiosk that runs for days.
+    def __init__(self, attendance_folder=ATTENDANCE_FOLDER, flush_interval=5.0, metrics=None, roster=None,
+                 compact_interval=60.0):
+        self.attendance_folder = attendance_folder
+        self.flush_interval = flush_interval
+        self.roster = roster
+        self.compact_interval = compact_interval
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("disk_writes", lambda: self.disk_writes)
+        self._pending = []
+        # Days with events not yet folded into their attendance.csv
+        self._dirty_days = set()
+        self._compacted_at = time.monotonic()
+        self._compacted_day = datetime.now().strftime("%Y-%m-%d")
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self.disk_writes = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+            if self.roster is None:
+                continue
+            today = datetime.now().strftime("%Y-%m-%d")
+            if today != self._compacted_day or time.monotonic() - self._compacted_at >= self.compact_interval:
+                self.compact_pending(self.roster())
+                self._compacted_day = today
+
+    def events_path(self, day):
+        return os.path.join(day_folder(day, self.attendance_folder), EVENTS_FILE)
+
+    def record(self, event, student_name, when=None):
+        when = when or datetime.now()
+        with self._lock:
+            self._pending.append((when, event, student_name))
+
+    def flush(self):
+        # Serialised so batches reach the log in the order they were recorded
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        started = time.perf_counter()
+        by_day = {}
+        for when, event, student_name in pending:
+            by_day.setdefault(when.strftime("%Y-%m-%d"), []).append((when, event, student_name))
+        for day, events in by_day.items():
+            path = self.events_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", newline="") as f:
+                writer = csv.writer(f)
+                for when, event, student_name in events:
+                    writer.writerow([when.isoformat(), event, student_name])
+                f.flush()
+                os.fsync(f.fileno())
+            self.disk_writes += 1
+            with self._lock:
+                self._dirty_days.add(day)
+        self.metrics.observe("disk_write", time.perf_counter() - started)
+
+    def load_day(self, day=None):
+        # Entry/exit state already logged for a day, so a restart carries on
+        # where the previous run stopped.
+        return fold_events(read_events(self.events_path(day or datetime.now())))
+
+    def compact(self, student_names, day=None):
+        # Rewrites attendance/<date>/attendance.csv from the event log, with
+        # one row per registered student in the original sheet format.
+        day = day or datetime.now()
+        state = self.load_day(day)
+        names = list(student_names)
+        known = set(names)
+        names.extend(name for name in state if name not in known)
+        rows = [(name,) + state.get(name, (None, None)) for name in names]
+        write_attendance_csv(os.path.join(day_folder(day, self.attendance_folder), ATTENDANCE_FILE), rows)
+
+    def compact_pending(self, student_names, today=False):
+        # Compacts every day whose log changed since its last compaction,
+        # and today's as well when `today` is set
+        with self._lock:
+            days, self._dirty_days = self._dirty_days, set()
+        if today:
+            days.add(datetime.now().strftime("%Y-%m-%d"))
+        for day in sorted(days):
+            self.compact(student_names, day)
+        self._compacted_at = time.monotonic()
+
+    def close(self, student_names=None):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+        if student_names is not None:
+            self.compact_pending(student_names, today=True)
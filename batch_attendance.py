@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from attendance_log import EXIT, write_attendance_csv
+from detectors import DETECTOR_TYPES, shared_detector
+from encoding_cache import EncodingCache, DEFAULT_CACHE_DIR, read_registry_rows
+from gallery import Gallery, MATCH_THRESHOLD
+from pipeline import detect_and_encode
+from presence import PresenceTracker
+from registry import REGISTRY_DB
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# Set once per worker process by _init_worker
+_gallery = None
+_threshold = MATCH_THRESHOLD
+_detector = "hog"
+_detector_options = None
+
+
+def _init_worker(encodings, names, threshold, detector="hog", detector_options=None):
+    global _gallery, _threshold, _detector, _detector_options
+    _gallery = Gallery()
+    _gallery.add_many(encodings, names)
+    _threshold = threshold
+    _detector = detector
+    _detector_options = detector_options
+
+
+def _recognize(bgr_frame, detection_scale):
+    rgb_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+    face_locations, face_encodings = detect_and_encode(rgb_frame, detection_scale, _detector, _detector_options)
+    return [name for name in _gallery.identify(face_encodings, _threshold) if name != "Unknown"]
+
+
+class WorkUnit:
+    # A slice of one input: frames [start, stop) of a video or stream
+    # (stop None = until it ends), or a list of still images.
+    def __init__(self, source, start=0, stop=None, images=None, base_time=0.0):
+        self.source = source
+        self.start = start
+        self.stop = stop
+        self.images = images
+        self.base_time = base_time
+
+
+def process_unit(unit, every=5, detection_scale=1.0):
+    # Runs detect -> encode -> match over one work unit and returns
+    # (frames processed, [(timestamp, name, from a still image), ...]) sightings.
+    sightings = []
+    frames = 0
+    if unit.images is not None:
+        for image_path in unit.images:
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"Could not read '{image_path}'")
+                continue
+            frames += 1
+            seen_at = os.path.getmtime(image_path)
+            sightings.extend((seen_at, name, True) for name in _recognize(image, detection_scale))
+        return frames, sightings
+
+    video_capture = cv2.VideoCapture(unit.source)
+    fps = video_capture.get(cv2.CAP_PROP_FPS) or 25.0
+    if unit.start:
+        video_capture.set(cv2.CAP_PROP_POS_FRAMES, unit.start)
+    index = unit.start
+    try:
+        while unit.stop is None or index < unit.stop:
+            if (index - unit.start) % every:
+                # Skipped frames are only grabbed, never decoded
+                if not video_capture.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = video_capture.read()
+            if not ret:
+                break
+            frames += 1
+            seen_at = unit.base_time + index / fps
+            sightings.extend((seen_at, name, False) for name in _recognize(frame, detection_scale))
+            index += 1
+    finally:
+        video_capture.release()
+    return frames, sightings
+
+
+def plan_units(inputs, chunk_frames=3000, chunk_images=200, start_time=None):
+    # Splits every input into work units. Seekable video files are cut into
+    # chunks of `chunk_frames` frames so one long recording still spreads
+    # over all workers; streams are processed whole.
+    units = []
+    for source in inputs:
+        if os.path.isdir(source):
+            images = sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            for start in range(0, len(images), chunk_images):
+                units.append(WorkUnit(source, images=images[start:start + chunk_images]))
+            continue
+
+        if os.path.isfile(source):
+            video_capture = cv2.VideoCapture(source)
+            frame_count = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = video_capture.get(cv2.CAP_PROP_FPS) or 25.0
+            video_capture.release()
+            # Without an explicit start time, assume the recording ended when
+            # the file was last written and began its duration before that
+            base_time = start_time
+            if base_time is None:
+                base_time = os.path.getmtime(source) - max(frame_count, 0) / fps
+            if frame_count > 0:
+                for start in range(0, frame_count, chunk_frames):
+                    units.append(WorkUnit(source, start, min(start + chunk_frames, frame_count),
+                                          base_time=base_time))
+                continue
+        else:
+            base_time = start_time if start_time is not None else time.time()
+        units.append(WorkUnit(source, base_time=base_time))
+    return units
+
+
+class BatchResult:
+    def __init__(self, presence, events, frames, elapsed):
+        self.presence = presence
+        # [(datetime, event, student name), ...] in time order
+        self.events = events
+        self.frames = frames
+        self.elapsed = elapsed
+
+    def write_csv(self, path):
+        write_attendance_csv(path, ((name,) + self.presence.times(name) for name in self.presence.names))
+
+    def to_json(self):
+        students = {}
+        for name in self.presence.names:
+            entry_time, exit_time = self.presence.times(name)
+            students[name] = {
+                "entry_time": entry_time.isoformat() if entry_time else None,
+                "exit_time": exit_time.isoformat() if exit_time else None,
+            }
+        return {
+            "frames": self.frames,
+            "elapsed_s": self.elapsed,
+            "frames_per_s": self.frames / self.elapsed if self.elapsed else None,
+            "events": [{"time": when.isoformat(), "event": event, "student": name}
+                       for when, event, name in self.events],
+            "students": students,
+        }
+
+
+def run_batch(inputs, registry_csv=REGISTRY_DB, cache_dir=DEFAULT_CACHE_DIR,
+              workers=None, every=5, detection_scale=1.0, threshold=MATCH_THRESHOLD,
+              start_time=None, presence_options=None, detector="hog", detector_options=None):
+    # Library entry point: recognizes everyone in the given videos, streams
+    # and image folders with a process pool and folds the sightings through
+    # the same presence state machine as the live app.
+    started = time.perf_counter()
+    # Fails here, rather than in every worker, if the backend can't be built
+    shared_detector(detector, detector_options)
+    rows = read_registry_rows(registry_csv)
+    encodings, names, _ = EncodingCache(cache_dir).sync(rows)
+    encodings = encodings.copy()
+
+    units = plan_units(inputs, start_time=start_time)
+    frames = 0
+    sightings = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(encodings, names, threshold, detector, detector_options)) as executor:
+        futures = [executor.submit(process_unit, unit, every, detection_scale) for unit in units]
+        for future in futures:
+            unit_frames, unit_sightings = future.result()
+            frames += unit_frames
+            sightings.extend(unit_sightings)
+
+    presence = PresenceTracker(**(presence_options or {}))
+    for name in names:
+        presence.add(name)
+    events = []
+    sightings.sort()
+    for seen_at, name, still in sightings:
+        for exited in presence.sweep(seen_at):
+            events.append((presence.times(exited)[1], EXIT, exited))
+        # A still is all there is of that moment, so one recognition in it
+        # is as good as a confirmed run of video frames
+        event = presence.observe(name, seen_at, presence.min_confirmations if still else 1)
+        if event is not None:
+            events.append((datetime.fromtimestamp(seen_at), event, name))
+    if sightings:
+        for exited in presence.sweep(sightings[-1][0]):
+            events.append((presence.times(exited)[1], EXIT, exited))
+    events.sort()
+    return BatchResult(presence, events, frames, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Take attendance from recorded video, streams or image folders")
+    parser.add_argument("inputs", nargs="+", help="video files, stream URLs or directories of images")
+    parser.add_argument("--registry", default=REGISTRY_DB, help="registry store (.db) or CSV")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--every", type=int, default=5, help="process every Nth video frame")
+    parser.add_argument("--detection-scale", type=float, default=1.0)
+    parser.add_argument("--detector", default="hog", choices=sorted(DETECTOR_TYPES),
+                        help="face detection backend, see detectors.py")
+    parser.add_argument("--detector-options", type=json.loads, default=None,
+                        help='JSON settings for the detector, e.g. \'{"cascade_path": "lbpcascade_frontalface.xml"}\'')
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    parser.add_argument("--start", default=None,
+                        help="ISO time the recordings started (default: file modification time)")
+    parser.add_argument("--min-confirmations", type=int, default=3)
+    parser.add_argument("--exit-timeout", type=float, default=600.0)
+    parser.add_argument("--csv", help="write the attendance sheet here")
+    parser.add_argument("--json", help="write events and per-student times here")
+    args = parser.parse_args(argv)
+
+    start_time = datetime.fromisoformat(args.start).timestamp() if args.start else None
+    result = run_batch(args.inputs, args.registry, args.cache_dir, args.workers, args.every,
+                       args.detection_scale, args.threshold, start_time,
+                       {"min_confirmations": args.min_confirmations, "exit_timeout": args.exit_timeout},
+                       args.detector, args.detector_options)
+    if args.csv:
+        result.write_csv(args.csv)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result.to_json(), f, indent=2)
+    present = sum(1 for name in result.presence.names if result.presence.times(name)[0] is not None)
+    print(f"{result.frames} frames in {result.elapsed:.1f}s "
+          f"({result.frames / max(result.elapsed, 1e-9):.1f} frames/s), "
+          f"{present}/{len(result.presence)} students seen")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
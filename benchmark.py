@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import face_recognition
+import numpy as np
+
+from attendance_log import AttendanceWriter, ENTRY, write_attendance_csv
+from detectors import DETECTOR_TYPES
+from gallery import Gallery, MATCH_THRESHOLD
+from gallery_index import make_index, synthetic_gallery
+from pipeline import detect_and_encode, detect_faces
+from presence import PresenceTracker
+from tracking import iou
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# A detection overlapping a reference face by at least this much finds it;
+# backends draw their boxes differently, so this is looser than usual
+RECALL_IOU = 0.3
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process so far (it never goes down)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def measure(fn, inputs, items_per_call=1, warmup=1):
+    # Calls fn once per input and summarises the per-call latencies
+    for value in inputs[:warmup]:
+        fn(value)
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        samples.append(time.perf_counter() - start)
+    samples = np.array(samples)
+    total = samples.sum()
+    return {
+        "calls": len(samples),
+        "throughput_per_s": items_per_call * len(samples) / total if total else None,
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p95_ms": float(np.percentile(samples, 95) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "mean_ms": float(samples.mean() * 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def synthetic_frames(resolution, faces_per_frame, count, face_image=None, seed=0):
+    # BGR frames of the given size with faces_per_frame copies of face_image
+    # pasted on a grid (with a little jitter so frames differ); without a face
+    # image the frames are just noise, which still exercises detection cost.
+    width, height = resolution
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+    if face_image is None or faces_per_frame == 0:
+        return [np.roll(background, i, axis=1) for i in range(count)]
+
+    columns = int(np.ceil(np.sqrt(faces_per_frame)))
+    rows = int(np.ceil(faces_per_frame / columns))
+    cell = min(width // columns, height // rows)
+    face = cv2.resize(face_image, (int(cell * 0.8), int(cell * 0.8)), interpolation=cv2.INTER_AREA)
+    frames = []
+    for _ in range(count):
+        frame = background.copy()
+        for n in range(faces_per_frame):
+            jitter = rng.integers(0, max(1, cell - face.shape[0]), size=2)
+            top = (n // columns) * cell + jitter[0]
+            left = (n % columns) * cell + jitter[1]
+            frame[top:top + face.shape[0], left:left + face.shape[1]] = face
+        frames.append(frame)
+    return frames
+
+
+def recorded_frames(video_path, count, resolution=None):
+    video_capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = video_capture.read()
+        if not ret:
+            break
+        if resolution is not None:
+            frame = cv2.resize(frame, resolution, interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    video_capture.release()
+    return frames
+
+
+def bench_detection(frames, detection_scale):
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+
+    def detect(rgb_frame):
+        if detection_scale != 1.0:
+            rgb_frame = cv2.resize(rgb_frame, None, fx=detection_scale, fy=detection_scale,
+                                   interpolation=cv2.INTER_AREA)
+        return face_recognition.face_locations(rgb_frame)
+
+    faces_found = len(detect(rgb_frames[0]))
+    result = measure(detect, rgb_frames)
+    result["faces_found_first_frame"] = faces_found
+    return result
+
+
+def matched_faces(found, reference, threshold=RECALL_IOU):
+    # How many reference boxes are matched one-to-one by a found box
+    remaining = list(found)
+    matched = 0
+    for box in reference:
+        best = max(remaining, key=lambda face: iou(face, box), default=None)
+        if best is not None and iou(best, box) >= threshold:
+            remaining.remove(best)
+            matched += 1
+    return matched
+
+
+def bench_detector(frames, detector, detection_scale, reference):
+    # Speed of one detection backend, and its recall against the faces a
+    # reference detector found in the same frames
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    found = [detect_faces(rgb_frame, detection_scale, detector) for rgb_frame in rgb_frames]
+    result = measure(lambda rgb_frame: detect_faces(rgb_frame, detection_scale, detector), rgb_frames, warmup=0)
+    reference_faces = sum(len(faces) for faces in reference)
+    matched = sum(matched_faces(faces, frame_reference) for faces, frame_reference in zip(found, reference))
+    result["reference_faces"] = reference_faces
+    result["faces_found"] = sum(len(faces) for faces in found)
+    result["recall"] = matched / reference_faces if reference_faces else None
+    # Found faces the reference doesn't have: false positives, or faces the
+    # reference missed
+    result["extra_faces"] = result["faces_found"] - matched
+    return result
+
+
+def bench_encoding(frames):
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    # Encode at the detected positions so the number of crops is realistic
+    located = [(rgb, face_recognition.face_locations(rgb)) for rgb in rgb_frames]
+    faces = sum(len(locations) for _, locations in located)
+    result = measure(lambda item: face_recognition.face_encodings(item[0], item[1]), located)
+    result["faces_encoded"] = faces
+    return result
+
+
+def bench_matching(gallery_size, faces_per_frame, index_kind, frames, seed=0):
+    vectors = synthetic_gallery(gallery_size, seed=seed)
+    gallery = Gallery(make_index(index_kind))
+    build_start = time.perf_counter()
+    gallery.add_many(vectors, [str(i) for i in range(gallery_size)])
+    build_s = time.perf_counter() - build_start
+    rng = np.random.default_rng(seed + 1)
+    queries = [
+        vectors[rng.integers(gallery_size, size=faces_per_frame)]
+        + rng.normal(scale=0.02, size=(faces_per_frame, vectors.shape[1])).astype(np.float32)
+        for _ in range(frames)
+    ]
+    result = measure(lambda q: gallery.identify(q, MATCH_THRESHOLD), queries, items_per_call=faces_per_frame)
+    result["build_s"] = build_s
+    result["index_mb"] = gallery.index.nbytes / 1e6
+    return result
+
+
+def bench_attendance(roster_size, events):
+    folder = tempfile.mkdtemp(prefix="attendance_bench_")
+    try:
+        names = [f"STUDENT {i}" for i in range(roster_size)]
+        writer = AttendanceWriter(folder)
+
+        def log_event(name):
+            writer.record(ENTRY, name)
+            writer.flush()
+
+        results = {"append_log": measure(log_event, names[:events])}
+        results["compact"] = measure(lambda _: writer.compact(names), [None] * 5)
+
+        # What every detection used to cost: rewriting the whole sheet
+        rows = [(name, datetime.now(), None) for name in names]
+        path = os.path.join(folder, "rewrite.csv")
+        results["full_rewrite"] = measure(lambda _: write_attendance_csv(path, rows), [None] * min(events, 50))
+        return results
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_end_to_end(frames, gallery_size, detection_scale, index_kind):
+    vectors = synthetic_gallery(gallery_size)
+    gallery = Gallery(make_index(index_kind))
+    gallery.add_many(vectors, [str(i) for i in range(gallery_size)])
+    presence = PresenceTracker()
+    for i in range(gallery_size):
+        presence.add(str(i))
+
+    def process(frame):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        face_locations, face_encodings = detect_and_encode(rgb_frame, detection_scale)
+        now = time.time()
+        for name in gallery.identify(face_encodings, MATCH_THRESHOLD):
+            presence.observe(name, now)
+
+    return measure(process, frames)
+
+
+def run_suite(args):
+    face_image = cv2.imread(args.face_image) if args.face_image else None
+    if args.face_image and face_image is None:
+        raise SystemExit(f"Could not read face image '{args.face_image}'")
+
+    cases = []
+
+    def record(stage, params, result):
+        cases.append({"stage": stage, "params": params, "result": result})
+        recall = f" recall={result['recall']:.2f}" if result.get("recall") is not None else ""
+        print(f"{stage:<12} {json.dumps(params):<70} "
+              f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+              f"throughput={result['throughput_per_s'] or 0:.1f}/s{recall}")
+
+    for resolution_text in args.resolutions:
+        resolution = parse_resolution(resolution_text)
+        for faces in args.faces:
+            if args.video:
+                frames = recorded_frames(args.video, args.frames, resolution)
+                source = args.video
+            else:
+                frames = synthetic_frames(resolution, faces, args.frames, face_image)
+                source = "synthetic"
+            if not frames:
+                continue
+            params = {"source": source, "resolution": resolution_text, "faces": faces}
+            if "detect" in args.stages:
+                for scale in args.detection_scales:
+                    record("detect", dict(params, detection_scale=scale), bench_detection(frames, scale))
+            if "detectors" in args.stages:
+                # Every backend against what the reference finds at full resolution
+                reference = [detect_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1.0, args.reference_detector)
+                             for frame in frames]
+                for detector in args.detectors:
+                    for scale in args.detection_scales:
+                        try:
+                            result = bench_detector(frames, detector, scale, reference)
+                        except (OSError, ValueError) as e:
+                            print(f"detector '{detector}' skipped: {e}")
+                            break
+                        record("detector", dict(params, detector=detector, detection_scale=scale,
+                                                reference=args.reference_detector), result)
+            if "encode" in args.stages:
+                record("encode", params, bench_encoding(frames))
+            if "end_to_end" in args.stages:
+                for scale in args.detection_scales:
+                    record("end_to_end", dict(params, detection_scale=scale, gallery=args.e2e_gallery,
+                                              index=args.index[0]),
+                           bench_end_to_end(frames, args.e2e_gallery, scale, args.index[0]))
+            if args.video:
+                # Recorded footage doesn't vary with the faces setting
+                break
+
+    if "match" in args.stages:
+        for index_kind in args.index:
+            for size in args.gallery_sizes:
+                for faces in args.faces:
+                    record("match", {"index": index_kind, "gallery": size, "faces": faces},
+                           bench_matching(size, max(faces, 1), index_kind, args.frames * 5))
+
+    if "attendance" in args.stages:
+        for size in args.roster_sizes:
+            for stage, result in bench_attendance(size, args.frames).items():
+                record("attendance", {"roster": size, "operation": stage}, result)
+
+    return {
+        "created": datetime.now().isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "cases": cases,
+    }
+
+
+def case_key(case):
+    return case["stage"] + " " + json.dumps(case["params"], sort_keys=True)
+
+
+def compare(old, new, tolerance):
+    # Prints p50/p95/throughput ratios for the cases both runs share and
+    # returns the number that regressed by more than the tolerance
+    old_cases = {case_key(case): case["result"] for case in old["cases"]}
+    regressions = 0
+    for case in new["cases"]:
+        key = case_key(case)
+        if key not in old_cases:
+            continue
+        before, after = old_cases[key], case["result"]
+        ratio = after["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        p95_ratio = after["p95_ms"] / before["p95_ms"] if before["p95_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance or p95_ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<90} p50 x{ratio:.2f}  p95 x{p95_ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recognition pipeline stages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark suite and write JSON results")
+    run.add_argument("--stages", nargs="+",
+                     default=["detect", "detectors", "encode", "match", "attendance", "end_to_end"],
+                     choices=["detect", "detectors", "encode", "match", "attendance", "end_to_end"])
+    run.add_argument("--video", help="recorded footage to use instead of synthetic frames")
+    run.add_argument("--face-image", help="face photo pasted into the synthetic frames")
+    run.add_argument("--frames", type=int, default=20, help="frames (or calls) per case")
+    run.add_argument("--resolutions", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    run.add_argument("--faces", type=int, nargs="+", default=[1, 5, 20], help="faces per frame")
+    run.add_argument("--detection-scales", type=float, nargs="+", default=[1.0, 0.5])
+    run.add_argument("--detectors", nargs="+", default=["hog", "haar", "lbp", "dnn", "cascade"],
+                     choices=sorted(DETECTOR_TYPES), help="detection backends for the detectors stage")
+    run.add_argument("--reference-detector", default="hog", choices=sorted(DETECTOR_TYPES),
+                     help="backend whose full-resolution faces recall is measured against")
+    run.add_argument("--gallery-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    run.add_argument("--index", nargs="+", default=["exact"],
+                     help="gallery index kinds to match with (exact, ivf, float16, int8)")
+    run.add_argument("--e2e-gallery", type=int, default=1000, help="gallery size for end_to_end")
+    run.add_argument("--roster-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    run.add_argument("--output", default="benchmark.json")
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.tolerance) else 0
+
+    results = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to '{args.output}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import face_recognition
+import numpy as np
+
+from batch_attendance import IMAGE_EXTENSIONS
+from encoding_cache import EncodingCache, DEFAULT_CACHE_DIR, encode_photo, read_registry_rows
+from face_quality import ENROLL_MIN_FACE_SIZE, assess_face
+from gallery import Gallery
+from gallery_index import ENCODING_DIM
+from registry import (REGISTRY_DB, is_registry_store, load_registered_students, open_registry,
+                      save_registered_students, join_photo_paths, split_photo_paths)
+
+# Two enrollments closer than this are probably the same person
+DUPLICATE_THRESHOLD = 0.35
+
+ACCEPTED = "accepted"
+NO_FACE = "no face"
+MULTIPLE_FACES = "multiple faces"
+LOW_QUALITY = "low quality"
+UNREADABLE = "unreadable"
+DUPLICATE = "duplicate"
+ALREADY_REGISTERED = "already registered"
+
+
+def encode_enrollment_photo(photo_path):
+    # Runs in the worker pool: decode, detect and encode one photo.
+    # Returns (status, encoding); only photos with exactly one face pass.
+    try:
+        image = face_recognition.load_image_file(photo_path)
+    except (OSError, ValueError):
+        return UNREADABLE, None
+    face_locations = face_recognition.face_locations(image)
+    if len(face_locations) == 0:
+        return NO_FACE, None
+    if len(face_locations) > 1:
+        return MULTIPLE_FACES, None
+    # Roster photos are often cropped tight, so a face box touching the
+    # edge isn't a reason to reject them
+    if not assess_face(image, face_locations[0], ENROLL_MIN_FACE_SIZE, edges=False).ok:
+        return LOW_QUALITY, None
+    return ACCEPTED, face_recognition.face_encodings(image, face_locations)[0]
+
+
+def encode_registered_photo(photo_path):
+    # Runs in the worker pool for photos already in the registry that the
+    # encoding cache lacks: (readable, encoding or None for no face)
+    try:
+        return True, encode_photo(photo_path)
+    except (OSError, ValueError):
+        return False, None
+
+
+def candidates_from_folder(folder, course, cohort):
+    # One photo per student, named after the student ("JANE_DOE.jpg")
+    candidates = []
+    for file_name in sorted(os.listdir(folder)):
+        stem, extension = os.path.splitext(file_name)
+        if extension.lower() not in IMAGE_EXTENSIONS:
+            continue
+        candidates.append({
+            "name": stem.replace("_", " ").strip().upper(),
+            "course": course,
+            "cohort": str(cohort),
+            "photo_path": os.path.abspath(os.path.join(folder, file_name)),
+        })
+    return candidates
+
+
+def candidates_from_roster(roster_csv):
+    # A CSV in the RegisteredStudents.csv layout; its IDs are not reused and
+    # PhotoPath may list several photos of the same student
+    candidates = []
+    with open(roster_csv, "r") as csvfile:
+        for row in csv.DictReader(csvfile):
+            candidates.append({
+                "name": row["Name"],
+                "course": row["Course"],
+                "cohort": row["Cohort"],
+                "photo_path": row["PhotoPath"],
+            })
+    return candidates
+
+
+def bulk_enroll(candidates, registry_csv=REGISTRY_DB, cache_dir=DEFAULT_CACHE_DIR,
+                workers=None, duplicate_threshold=DUPLICATE_THRESHOLD, keep_duplicates=False):
+    # Encodes every candidate photo in parallel, then registers the ones
+    # with exactly one face that don't duplicate an existing or earlier
+    # identity, writing the registry (in one transaction for the registry
+    # store) and the encoding cache once at the end.
+    # Returns a report: [(candidate, status, detail), ...].
+    students_info = load_registered_students(registry_csv)
+    cache = EncodingCache(cache_dir)
+    rows = read_registry_rows(registry_csv) if students_info else []
+    # Registered photos the cache lacks are encoded in the pool as well,
+    # instead of one by one by cache.sync() below
+    uncached = cache.uncached(rows)
+    registered = {(info["name"], info["course"], info["cohort"]) for info in students_info.values()}
+
+    photo_paths = [split_photo_paths(c["photo_path"]) for c in candidates]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        existing_results = executor.map(encode_registered_photo, [row[0] for row in uncached], chunksize=8)
+        photo_results = iter(executor.map(encode_enrollment_photo,
+                                          [path for paths in photo_paths for path in paths], chunksize=8))
+        # Regroup per candidate: [(photo path, status, encoding), ...]
+        results = [[(path,) + next(photo_results) for path in paths] for paths in photo_paths]
+        cache.add_encodings([row + (encoding,) for row, (readable, encoding) in zip(uncached, existing_results)
+                             if readable])
+    if rows:
+        existing_encodings, existing_names, _ = cache.sync(rows)
+    else:
+        existing_encodings, existing_names = np.zeros((0, ENCODING_DIM), dtype=np.float32), []
+
+    gallery = Gallery()
+    gallery.add_many(existing_encodings, existing_names)
+    # Let go of the cache's memory map before add_encodings replaces the file
+    del existing_encodings
+    report = []
+    # (student info, [(photo path, encoding), ...]) for everyone accepted
+    enrolled = []
+    for candidate, photos in zip(candidates, results):
+        key = (candidate["name"], candidate["course"], candidate["cohort"])
+        accepted = [(path, encoding) for path, status, encoding in photos if status == ACCEPTED]
+        rejected = [f"{os.path.basename(path)}: {status}" for path, status, _ in photos if status != ACCEPTED]
+        if not accepted:
+            report.append((candidate, photos[0][1] if photos else NO_FACE, "; ".join(rejected)))
+            continue
+        if key in registered:
+            report.append((candidate, ALREADY_REGISTERED, ""))
+            continue
+
+        # Compare the mean of the new photos against everyone enrolled so far
+        encodings = np.array([encoding for _, encoding in accepted], dtype=np.float32)
+        ids, distances = gallery.match(encodings.mean(axis=0), k=1)
+        details = list(rejected)
+        if distances[0, 0] < duplicate_threshold:
+            details.append(f"{gallery.names[ids[0, 0]]} at distance {distances[0, 0]:.3f}")
+            if not keep_duplicates:
+                report.append((candidate, DUPLICATE, "; ".join(details)))
+                continue
+        detail = "; ".join(details)
+
+        # Only the photos that passed are kept on the student's record
+        enrolled.append((dict(candidate, photo_path=join_photo_paths(p for p, _ in accepted)), accepted))
+        gallery.add_many(encodings, [candidate["name"]] * len(encodings))
+        registered.add(key)
+        report.append((candidate, ACCEPTED, detail))
+
+    if not enrolled:
+        return report
+    if is_registry_store(registry_csv):
+        with open_registry(registry_csv) as store:
+            student_ids = store.add_students([dict(info, encodings=dict(accepted)) for info, accepted in enrolled])
+    else:
+        first_id = max(students_info, default=0) + 1
+        student_ids = list(range(first_id, first_id + len(enrolled)))
+        students_info.update(zip(student_ids, (info for info, _ in enrolled)))
+        save_registered_students(registry_csv, students_info)
+    cache.add_encodings([(path, info["name"], str(student_id), encoding)
+                         for student_id, (info, accepted) in zip(student_ids, enrolled)
+                         for path, encoding in accepted])
+    return report
+
+
+def write_report(path, report):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Name", "Course", "Cohort", "PhotoPath", "Status", "Detail"])
+        for candidate, status, detail in report:
+            writer.writerow([candidate["name"], candidate["course"], candidate["cohort"],
+                             candidate["photo_path"], status, detail])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll many students at once from photos or a roster CSV")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--folder", help="folder of photos named after each student")
+    source.add_argument("--roster", help="CSV with Name, Course, Cohort and PhotoPath columns")
+    parser.add_argument("--course", help="course for every student in --folder")
+    parser.add_argument("--cohort", help="cohort for every student in --folder")
+    parser.add_argument("--registry", default=REGISTRY_DB, help="registry store (.db) or CSV")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--duplicate-threshold", type=float, default=DUPLICATE_THRESHOLD)
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="enroll likely duplicates anyway (they are still flagged in the report)")
+    parser.add_argument("--report", default="enrollment_report.csv")
+    args = parser.parse_args(argv)
+
+    if args.folder:
+        if not args.course or not args.cohort or not args.cohort.isdigit():
+            parser.error("--folder needs --course and a numeric --cohort")
+        candidates = candidates_from_folder(args.folder, args.course, args.cohort)
+    else:
+        candidates = candidates_from_roster(args.roster)
+
+    report = bulk_enroll(candidates, args.registry, args.cache_dir, args.workers,
+                         args.duplicate_threshold, args.keep_duplicates)
+    write_report(args.report, report)
+
+    counts = {}
+    for _, status, _ in report:
+        counts[status] = counts.get(status, 0) + 1
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    print(f"Report written to '{args.report}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import os
+import threading
+
+import cv2
+import face_recognition
+import numpy as np
+
+# Boxes everywhere are face_recognition's (top, right, bottom, left) in the
+# pixels of the RGB image handed to detect().
+
+# OpenCV ships its cascades with the opencv-python wheels; the DNN detector
+# (the res10 SSD from OpenCV's face_detector sample) has to be downloaded
+CASCADE_FOLDER = getattr(getattr(cv2, "data", None), "haarcascades", "")
+HAAR_CASCADE = os.path.join(CASCADE_FOLDER, "haarcascade_frontalface_default.xml")
+LBP_CASCADE = "lbpcascade_frontalface_improved.xml"
+DNN_CONFIG = os.path.join("models", "deploy.prototxt")
+DNN_MODEL = os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel")
+
+
+def _boxes_from_rects(rects, height, width):
+    # OpenCV (x, y, w, h) rectangles clipped to the image
+    return [(max(int(y), 0), min(int(x + w), width), min(int(y + h), height), max(int(x), 0))
+            for x, y, w, h in rects]
+
+
+class FaceDetector:
+    # Common interface of the detection backends: detect() takes an RGB
+    # image and returns the face boxes in it.
+    kind = None
+
+    def detect(self, rgb_image):
+        raise NotImplementedError
+
+
+class HOGDetector(FaceDetector):
+    # dlib's HOG detector through face_recognition, what the app always used.
+    # Each upsample finds faces half as small at about four times the cost.
+    kind = "hog"
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        return face_recognition.face_locations(rgb_image, self.upsample, model="hog")
+
+
+class CascadeClassifierDetector(FaceDetector):
+    # OpenCV's Viola-Jones cascades: much cheaper than HOG, but frontal only
+    # and with more false positives, which makes them best suited to
+    # screening frames for the cascade detector below.
+    kind = None
+    default_cascade = None
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=30):
+        cascade_path = cascade_path or self.default_cascade
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise FileNotFoundError(f"Could not load the {self.kind} cascade '{cascade_path}'")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb_image):
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY))
+        rects = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=(self.min_size, self.min_size))
+        return _boxes_from_rects(rects, *gray.shape)
+
+
+class HaarDetector(CascadeClassifierDetector):
+    kind = "haar"
+    default_cascade = HAAR_CASCADE
+
+
+class LBPDetector(CascadeClassifierDetector):
+    # Integer features; a few times faster than Haar at similar accuracy.
+    # The wheels don't include LBP cascades, so pass cascade_path to one
+    # from OpenCV's data/lbpcascades folder.
+    kind = "lbp"
+    default_cascade = LBP_CASCADE
+
+
+class DNNDetector(FaceDetector):
+    # OpenCV's SSD face detector on the CPU. Runs at a fixed input size
+    # whatever the frame size, finds turned and partly covered faces HOG
+    # misses, and is usually faster than HOG on frames above 640x480.
+    kind = "dnn"
+
+    def __init__(self, config_path=DNN_CONFIG, model_path=DNN_MODEL, confidence=0.6, input_size=300):
+        for path in (config_path, model_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"DNN face detector file '{path}' is missing")
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        # The network was trained on BGR images with these channel means
+        blob = cv2.dnn.blobFromImage(rgb_image, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= self.confidence]
+        scaled = detections[:, 3:7] * np.array([width, height, width, height])
+        return [(max(int(top), 0), min(int(right), width), min(int(bottom), height), max(int(left), 0))
+                for left, top, right, bottom in scaled
+                if right > left and bottom > top]
+
+
+class CascadeDetector(FaceDetector):
+    # A cheap detector (`screen`) looks at the whole frame and the expensive
+    # one (`verify`) only at the regions around what it found, grown by
+    # `margin` times the face size and merged where they overlap. Frames
+    # with nobody in them cost only the screen; the others a few small
+    # crops. A face the screen misses is missed, so tune the screen towards
+    # false positives (e.g. a low min_neighbors).
+    kind = "cascade"
+
+    def __init__(self, screen="haar", verify="hog", margin=0.5, screen_options=None, verify_options=None):
+        self.screen = make_detector(screen, **(screen_options or {}))
+        self.verify = make_detector(verify, **(verify_options or {}))
+        self.margin = margin
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        regions = []
+        for top, right, bottom, left in self.screen.detect(rgb_image):
+            grow = int(max(bottom - top, right - left) * self.margin)
+            regions.append((max(top - grow, 0), min(right + grow, width), min(bottom + grow, height),
+                            max(left - grow, 0)))
+        faces = []
+        for top, right, bottom, left in _merge_regions(regions):
+            crop = np.ascontiguousarray(rgb_image[top:bottom, left:right])
+            faces.extend((face_top + top, face_right + left, face_bottom + top, face_left + left)
+                         for face_top, face_right, face_bottom, face_left in self.verify.detect(crop))
+        return faces
+
+
+def _merge_regions(regions):
+    # Replaces overlapping boxes with their union until none overlap
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]:
+                    regions[i] = (min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+DETECTOR_TYPES = {
+    HOGDetector.kind: HOGDetector,
+    HaarDetector.kind: HaarDetector,
+    LBPDetector.kind: LBPDetector,
+    DNNDetector.kind: DNNDetector,
+    CascadeDetector.kind: CascadeDetector,
+}
+
+
+def make_detector(kind="hog", **params):
+    try:
+        detector_type = DETECTOR_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown face detector '{kind}', expected one of {sorted(DETECTOR_TYPES)}")
+    return detector_type(**params)
+
+
+_local = threading.local()
+
+
+def shared_detector(kind="hog", options=None):
+    # One detector per kind and options per thread, built on first use. The
+    # pipeline's workers only receive the kind and options (detectors hold
+    # OpenCV/dlib objects that can't be sent to another process), and an
+    # OpenCV network must not run in two threads at once.
+    detectors = getattr(_local, "detectors", None)
+    if detectors is None:
+        detectors = _local.detectors = {}
+    key = (kind, repr(sorted((options or {}).items())))
+    detector = detectors.get(key)
+    if detector is None:
+        detector = detectors[key] = make_detector(kind, **(options or {}))
+    return detector
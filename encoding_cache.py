@@ -0,0 +1,277 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import face_recognition
+
+from gallery_index import ENCODING_DIM
+from registry import REGISTRY_DB, is_registry_store, open_registry, split_photo_paths
+
+DEFAULT_CACHE_DIR = "encoding_cache"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_photo(image_path):
+    image = face_recognition.load_image_file(image_path)
+    encodings = face_recognition.face_encodings(image)
+    if len(encodings) == 0:
+        return None
+    return encodings[0]
+
+
+def read_registry_rows(csv_file):
+    # (photo path, name, student id) for every photo in RegisteredStudents.csv
+    # or the registry store; students enrolled with several photos get one
+    # row per photo
+    if is_registry_store(csv_file):
+        with open_registry(csv_file) as store:
+            return store.photo_rows()
+    rows = []
+    with open(csv_file, "r") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            for photo_path in split_photo_paths(row["PhotoPath"]):
+                rows.append((photo_path, row["Name"], row.get("ID", "")))
+    return rows
+
+
+class EncodingCache:
+    # Encodings live in one float32 matrix (encodings.npy, memory-mapped on
+    # load) and index.json maps each photo path to its row together with the
+    # file mtime, size and sha1 the encoding was computed from. A row of -1
+    # records a photo in which no face was found so it isn't retried.
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.matrix_path = os.path.join(cache_dir, "encodings.npy")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.entries = {}
+        self.matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        # Set when lookup() refreshed an entry's mtime that isn't saved yet
+        self._touched = False
+        self.load()
+
+    def load(self):
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.index_path)):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                entries = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            print(f"Encoding cache in '{self.cache_dir}' is unreadable, rebuilding")
+            return
+        if matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIM:
+            print(f"Encoding cache in '{self.cache_dir}' has the wrong shape, rebuilding")
+            return
+        self.entries = entries
+        self.matrix = matrix
+
+    def save(self, matrix, entries):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write both files next to their final names and swap them in, so a
+        # crash mid-save never leaves a half-written cache behind.
+        matrix_tmp = self.matrix_path + ".tmp"
+        index_tmp = self.index_path + ".tmp"
+        with open(matrix_tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(index_tmp, "w") as f:
+            json.dump(entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Drop our memory map of the old file first; Windows refuses to
+        # replace a file that is still mapped.
+        self.matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        os.replace(matrix_tmp, self.matrix_path)
+        os.replace(index_tmp, self.index_path)
+        self.entries = entries
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+        self._touched = False
+
+    def lookup(self, photo_path, stat=None):
+        # Returns the cached encoding for an unchanged photo, None for a
+        # cached "no face" result, or raises KeyError if it must be encoded.
+        entry = self.entries.get(photo_path)
+        if entry is None:
+            raise KeyError(photo_path)
+        if stat is None:
+            stat = os.stat(photo_path)
+        if entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+            # Touched but possibly identical (e.g. copied back from a backup)
+            if file_digest(photo_path) != entry["sha1"]:
+                raise KeyError(photo_path)
+            entry["mtime"] = stat.st_mtime
+            self._touched = True
+        if entry["row"] < 0:
+            return None
+        return self.matrix[entry["row"]]
+
+    def uncached(self, rows):
+        # The registry rows whose photos sync() would have to encode
+        uncached = []
+        for row in rows:
+            try:
+                self.lookup(row[0])
+            except KeyError:
+                uncached.append(row)
+            except OSError:
+                continue
+        return uncached
+
+    def sync(self, rows, force=False):
+        # Brings the cache in line with the registry rows and returns the
+        # (encodings, names, ids) of every student with a usable face.
+        # Only photos that are new or whose content changed get re-encoded.
+        encodings = []
+        names = []
+        ids = []
+        entries = {}
+        dirty = force or self._touched
+        for photo_path, student_name, student_id in rows:
+            try:
+                stat = os.stat(photo_path)
+            except OSError:
+                print(f"Photo '{photo_path}' for student '{student_name}' is missing")
+                dirty = dirty or photo_path in self.entries
+                continue
+
+            old_entry = self.entries.get(photo_path)
+            old_mtime = old_entry["mtime"] if old_entry else None
+            try:
+                if force:
+                    raise KeyError(photo_path)
+                encoding = self.lookup(photo_path, stat)
+                sha1 = old_entry["sha1"]
+                dirty = dirty or old_mtime != stat.st_mtime
+            except KeyError:
+                print(photo_path)
+                try:
+                    encoding = encode_photo(photo_path)
+                except (OSError, ValueError) as e:
+                    # Cached like a photo without a face until it's replaced
+                    print(f"Could not read photo '{photo_path}': {e}")
+                    encoding = None
+                sha1 = file_digest(photo_path)
+                dirty = True
+
+            if encoding is None:
+                print(f"No face found in the image for student '{student_name}'")
+                row = -1
+            else:
+                row = len(encodings)
+                encodings.append(np.asarray(encoding, dtype=np.float32))
+                names.append(student_name)
+                ids.append(student_id)
+
+            if old_entry is None or old_entry["row"] != row:
+                dirty = True
+            entries[photo_path] = {
+                "row": row,
+                "name": student_name,
+                "student_id": student_id,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha1": sha1,
+            }
+
+        if set(entries) != set(self.entries):
+            dirty = True
+        if not dirty:
+            return self.matrix, names, ids
+        if encodings:
+            matrix = np.vstack(encodings)
+            # The cached rows are views into the old memory map
+            encodings.clear()
+        else:
+            matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        self.save(matrix, entries)
+        return self.matrix, names, ids
+
+    def add_encodings(self, items):
+        # Stores encodings computed elsewhere (e.g. by bulk enrollment) for
+        # (photo path, name, student id, encoding) items, so the next sync
+        # finds them cached instead of encoding the photos again. An encoding
+        # of None records a photo without a face.
+        entries = dict(self.entries)
+        new_rows = []
+        start = len(self.matrix)
+        for photo_path, student_name, student_id, encoding in items:
+            stat = os.stat(photo_path)
+            entries[photo_path] = {
+                "row": start + len(new_rows) if encoding is not None else -1,
+                "name": student_name,
+                "student_id": student_id,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha1": file_digest(photo_path),
+            }
+            if encoding is not None:
+                new_rows.append(np.asarray(encoding, dtype=np.float32))
+        if entries == self.entries and not self._touched:
+            return
+        matrix = np.vstack([np.asarray(self.matrix)] + new_rows)
+        self.save(matrix, entries)
+
+    def verify(self, rows):
+        # Re-hashes every photo and checks it against the cache without
+        # modifying anything; returns a list of human-readable problems.
+        problems = []
+        registry_paths = set()
+        for photo_path, student_name, _ in rows:
+            registry_paths.add(photo_path)
+            entry = self.entries.get(photo_path)
+            if entry is None:
+                problems.append(f"not cached: {photo_path} ({student_name})")
+                continue
+            if not os.path.exists(photo_path):
+                problems.append(f"missing photo: {photo_path} ({student_name})")
+                continue
+            if file_digest(photo_path) != entry["sha1"]:
+                problems.append(f"content changed: {photo_path} ({student_name})")
+            if entry["row"] >= len(self.matrix):
+                problems.append(f"row {entry['row']} out of range: {photo_path}")
+            elif entry["row"] >= 0 and not np.all(np.isfinite(self.matrix[entry["row"]])):
+                problems.append(f"corrupt encoding: {photo_path}")
+        for photo_path in self.entries:
+            if photo_path not in registry_paths:
+                problems.append(f"stale entry: {photo_path}")
+        return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or verify the face encoding cache")
+    parser.add_argument("command", choices=["rebuild", "update", "verify"])
+    parser.add_argument("--registry", "--csv", dest="registry", default=REGISTRY_DB,
+                        help="registry store (.db) or registered students CSV")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    rows = read_registry_rows(args.registry)
+    cache = EncodingCache(args.cache_dir)
+
+    if args.command == "verify":
+        problems = cache.verify(rows)
+        for problem in problems:
+            print(problem)
+        print(f"{len(rows)} registered photos, {len(problems)} problem(s)")
+        return 1 if problems else 0
+
+    matrix, names, _ = cache.sync(rows, force=args.command == "rebuild")
+    print(f"{len(names)} encodings cached in '{args.cache_dir}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import cv2
+import face_recognition
+import numpy as np
+
+# Cheap checks run on every detected face before it is encoded. Boxes are
+# face_recognition's (top, right, bottom, left) in the image's own pixels.
+
+# Shorter side of the face box; smaller faces encode unreliably
+MIN_FACE_SIZE = 40
+# Enrollment photos are matched against for months, so they must be closer
+ENROLL_MIN_FACE_SIZE = 80
+# Variance of the Laplacian of the face, scaled to QUALITY_CROP pixels
+# square so faces of every size are scored alike; lower is blurrier
+MIN_SHARPNESS = 60.0
+QUALITY_CROP = 64
+# Mean grey level of the face
+MIN_BRIGHTNESS = 40
+MAX_BRIGHTNESS = 220
+# Nose tip offset from the midpoint between the eyes, along the line
+# through the eyes, as a fraction of the eye distance; about 0 for a face
+# looking at the camera
+MAX_YAW = 0.35
+
+TOO_SMALL = "too small"
+CUT_OFF = "cut off by the frame edge"
+BLURRY = "blurry"
+TOO_DARK = "too dark"
+TOO_BRIGHT = "too bright"
+TURNED_AWAY = "turned away"
+
+
+class FaceQuality:
+    def __init__(self, size, sharpness=0.0, brightness=0.0, yaw=None, problems=()):
+        self.size = size
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.yaw = yaw
+        self.problems = list(problems)
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    @property
+    def score(self):
+        # 0..1, for picking the better of two crops of the same face
+        score = min(self.size / (2 * MIN_FACE_SIZE), 1.0) * min(self.sharpness / (2 * MIN_SHARPNESS), 1.0)
+        if self.yaw is not None:
+            score *= 1.0 - min(abs(self.yaw) / (2 * MAX_YAW), 1.0)
+        return score
+
+
+def face_yaw(landmarks):
+    # From the 5-point landmarks of face_recognition.face_landmarks(model="small")
+    left_eye = np.mean(landmarks["left_eye"], axis=0)
+    right_eye = np.mean(landmarks["right_eye"], axis=0)
+    nose = np.mean(landmarks["nose_tip"], axis=0)
+    eye_line = right_eye - left_eye
+    eye_distance = float(np.linalg.norm(eye_line))
+    if eye_distance == 0:
+        return 0.0
+    return float(np.dot(nose - (left_eye + right_eye) / 2, eye_line)) / eye_distance ** 2
+
+
+def assess_face(rgb_image, box, min_size=MIN_FACE_SIZE, pose=True, edges=True):
+    # Cheapest checks first; the landmark pose check (about a millisecond)
+    # only runs on faces that passed everything else. edges=False skips the
+    # frame edge check, for photos cropped to the face on purpose.
+    top, right, bottom, left = box
+    height, width = rgb_image.shape[:2]
+    size = min(bottom - top, right - left)
+    if size < min_size:
+        return FaceQuality(size, problems=[TOO_SMALL])
+
+    problems = []
+    if edges and (top <= 0 or left <= 0 or bottom >= height or right >= width):
+        problems.append(CUT_OFF)
+    crop = rgb_image[max(top, 0):min(bottom, height), max(left, 0):min(right, width)]
+    gray = cv2.resize(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), (QUALITY_CROP, QUALITY_CROP),
+                      interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean())
+    if sharpness < MIN_SHARPNESS:
+        problems.append(BLURRY)
+    if brightness < MIN_BRIGHTNESS:
+        problems.append(TOO_DARK)
+    elif brightness > MAX_BRIGHTNESS:
+        problems.append(TOO_BRIGHT)
+
+    yaw = None
+    if pose and not problems:
+        yaw = face_yaw(face_recognition.face_landmarks(rgb_image, [box], model="small")[0])
+        if abs(yaw) > MAX_YAW:
+            problems.append(TURNED_AWAY)
+    return FaceQuality(size, sharpness, brightness, yaw, problems)
+
+
+def enrollment_problem(rgb_image):
+    # What makes a photo unfit to enroll a student with, or None if it's fine
+    face_locations = face_recognition.face_locations(rgb_image)
+    if not face_locations:
+        return "no face found"
+    if len(face_locations) > 1:
+        return "more than one face"
+    quality = assess_face(rgb_image, face_locations[0], ENROLL_MIN_FACE_SIZE)
+    return ", ".join(quality.problems) or None
@@ -0,0 +1,201 @@
+import numpy as np
+
+from gallery_index import ENCODING_DIM, ExactIndex, load_index
+
+MATCH_THRESHOLD = 0.3
+
+# How the encodings of a student with several enrollment photos are combined:
+#   "min"      - distance to the closest of the student's encodings
+#   "centroid" - distance to the mean of the student's encodings
+#   "vote"     - the student owning most of the VOTE_K nearest encodings
+#                under the threshold, ties going to the closest
+AGGREGATIONS = ("min", "centroid", "vote")
+VOTE_K = 5
+
+
+class Identity:
+    # One student's block of encodings: their face ids plus the running sum
+    # the centroid is derived from (None while no centroids are kept).
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.face_ids = []
+        self.total = None
+
+    def centroid(self):
+        return (self.total / len(self.face_ids)).astype(np.float32)
+
+
+class Gallery:
+    # Known faces and the names they belong to. The vectors themselves live
+    # in a GalleryIndex (exact scan by default, see gallery_index.py for the
+    # approximate backend); each encoding gets an integer id so students can
+    # be removed again when they leave. A student may have any number of
+    # encodings; a second, small exact index holds one centroid per student.
+    # That one is only kept for the "centroid" aggregation, or built on the
+    # first centroid query otherwise.
+    def __init__(self, index=None, aggregation="min"):
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {AGGREGATIONS}")
+        self.index = index if index is not None else ExactIndex()
+        self.aggregation = aggregation
+        self.names = {}
+        self.identities = {}
+        self._identity_numbers = {}
+        self._centroids = ExactIndex() if aggregation == "centroid" else None
+        self._next_id = 0
+        self._next_identity = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _identity(self, name):
+        identity = self.identities.get(name)
+        if identity is None:
+            identity = Identity(self._next_identity, name)
+            self._next_identity += 1
+            self.identities[name] = identity
+            self._identity_numbers[identity.number] = identity
+        return identity
+
+    def _refresh_centroid(self, identity):
+        if self._centroids is not None:
+            self._centroids.remove([identity.number])
+            if identity.face_ids:
+                self._centroids.add([identity.number], identity.centroid())
+        if not identity.face_ids:
+            del self.identities[identity.name]
+            del self._identity_numbers[identity.number]
+
+    def _centroid_index(self):
+        if self._centroids is None:
+            for identity in self.identities.values():
+                identity.total = np.zeros(ENCODING_DIM, dtype=np.float32)
+            state = self.index.state()
+            for face_id, vector in zip(state["ids"].tolist(), state["vectors"]):
+                self.identities[self.names[face_id]].total += vector
+            self._centroids = ExactIndex()
+            if self.identities:
+                identities = list(self.identities.values())
+                self._centroids.add([identity.number for identity in identities],
+                                    np.vstack([identity.centroid() for identity in identities]))
+        return self._centroids
+
+    def add(self, encoding, name):
+        return self.add_many(np.asarray(encoding).reshape(1, ENCODING_DIM), [name])[0]
+
+    def add_many(self, encodings, names):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        ids = list(range(self._next_id, self._next_id + len(names)))
+        self._next_id += len(names)
+        self.index.add(ids, encodings)
+        self.names.update(zip(ids, names))
+        touched = {}
+        for face_id, name, encoding in zip(ids, names, encodings):
+            identity = self._identity(name)
+            identity.face_ids.append(face_id)
+            if self._centroids is not None:
+                if identity.total is None:
+                    identity.total = np.zeros(ENCODING_DIM, dtype=np.float32)
+                identity.total += encoding
+            touched[name] = identity
+        for identity in touched.values():
+            self._refresh_centroid(identity)
+        return ids
+
+    def remove(self, ids, vectors=None):
+        # vectors: the removed encodings, if the caller has them, so the
+        # centroids can be updated without a rebuild
+        ids = list(ids)
+        self.index.remove(ids)
+        touched = {}
+        for position, face_id in enumerate(ids):
+            name = self.names.pop(face_id, None)
+            if name is None:
+                continue
+            identity = self.identities[name]
+            identity.face_ids.remove(face_id)
+            if vectors is not None and self._centroids is not None:
+                identity.total -= vectors[position]
+            touched[name] = identity
+        for identity in touched.values():
+            if vectors is None and identity.face_ids and self._centroids is not None:
+                identity.total = self._sum_encodings(identity.face_ids)
+            self._refresh_centroid(identity)
+
+    def _sum_encodings(self, face_ids):
+        state = self.index.state()
+        wanted = np.isin(state["ids"], face_ids)
+        return state["vectors"][wanted].sum(axis=0, dtype=np.float32)
+
+    def remove_student(self, name):
+        identity = self.identities.get(name)
+        if identity is None:
+            return
+        face_ids = list(identity.face_ids)
+        self.index.remove(face_ids)
+        for face_id in face_ids:
+            del self.names[face_id]
+        identity.face_ids = []
+        self._refresh_centroid(identity)
+
+    def match(self, encodings, k=1):
+        # Returns (ids, distances), both of shape (faces, k), sorted by
+        # ascending euclidean distance; missing neighbours are -1 / inf.
+        return self.index.search(encodings, k)
+
+    def identify(self, encodings, threshold=MATCH_THRESHOLD, aggregation=None):
+        # Name of the best matching student for each encoding, or "Unknown"
+        # when nobody is closer than the threshold.
+        aggregation = aggregation or self.aggregation
+        if aggregation == "centroid":
+            numbers, distances = self._centroid_index().search(encodings, k=1)
+            return [self._identity_numbers[number].name if distance < threshold else "Unknown"
+                    for number, distance in zip(numbers[:, 0].tolist(), distances[:, 0].tolist())]
+
+        if aggregation == "vote":
+            ids, distances = self.match(encodings, k=VOTE_K)
+            names = []
+            for row_ids, row_distances in zip(ids.tolist(), distances.tolist()):
+                votes = {}
+                for face_id, distance in zip(row_ids, row_distances):
+                    if distance >= threshold:
+                        break
+                    count, best = votes.get(self.names[face_id], (0, distance))
+                    votes[self.names[face_id]] = (count + 1, min(best, distance))
+                if votes:
+                    names.append(max(votes, key=lambda name: (votes[name][0], -votes[name][1])))
+                else:
+                    names.append("Unknown")
+            return names
+
+        ids, distances = self.match(encodings, k=1)
+        names = []
+        for face_id, distance in zip(ids[:, 0].tolist(), distances[:, 0].tolist()):
+            if distance >= threshold:
+                names.append("Unknown")
+            else:
+                names.append(self.names[face_id])
+        return names
+
+    def save(self, path):
+        ids = np.array(sorted(self.names), dtype=np.int64)
+        names = np.array([self.names[face_id] for face_id in ids.tolist()], dtype=str)
+        self.index.save(path, name_ids=ids, names=names, aggregation=np.array(self.aggregation))
+
+    @classmethod
+    def load(cls, path):
+        index, extra = load_index(path)
+        aggregation = str(extra["aggregation"]) if "aggregation" in extra else "min"
+        gallery = cls(index, aggregation)
+        names = dict(zip(extra["name_ids"].tolist(), extra["names"].tolist()))
+        # Rebuild the per-student blocks around the loaded index, so its ids
+        # and tuning are kept as they were
+        for face_id in index.state()["ids"].tolist():
+            gallery._identity(names[face_id]).face_ids.append(face_id)
+        gallery.names = names
+        gallery._next_id = max(names) + 1 if names else 0
+        if aggregation == "centroid":
+            gallery._centroids = None
+            gallery._centroid_index()
+        return gallery
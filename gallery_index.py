@@ -0,0 +1,642 @@
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ENCODING_DIM = 128
+# Int8 codes cover encodings in [-INT8_RANGE, INT8_RANGE]; dlib's face
+# encodings stay well inside it and anything outside is clipped (the exact
+# re-rank corrects the distance of whatever survives the scan)
+INT8_RANGE = 0.5
+# Rows of compressed codes expanded to float32 at a time while scanning;
+# small enough for the expanded block to stay in cache
+SCAN_CHUNK = 4096
+
+
+def _as_queries(vectors):
+    return np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM)
+
+
+def _sq_distances(queries, matrix, sq_norms):
+    # |q - g|^2 = |q|^2 + |g|^2 - 2 q.g for every query/row pair
+    sq_dists = queries @ matrix.T
+    sq_dists *= -2.0
+    sq_dists += sq_norms
+    sq_dists += np.einsum("ij,ij->i", queries, queries)[:, None]
+    return sq_dists
+
+
+def _top_k(sq_dists, k):
+    # Column indices and squared distances of the k smallest entries per row,
+    # sorted ascending. Rows with fewer than k columns are padded with -1/inf.
+    n, m = sq_dists.shape
+    if m > k:
+        cols = np.argpartition(sq_dists, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.broadcast_to(np.arange(m), (n, m)).copy()
+    top = np.take_along_axis(sq_dists, cols, axis=1)
+    order = np.argsort(top, axis=1)
+    cols = np.take_along_axis(cols, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    if m < k:
+        cols = np.hstack([cols, np.full((n, k - m), -1, dtype=cols.dtype)])
+        top = np.hstack([top, np.full((n, k - m), np.inf, dtype=np.float32)])
+    return cols, top
+
+
+def _pad_result(n, k):
+    return np.full((n, k), -1, dtype=np.int64), np.full((n, k), np.inf, dtype=np.float32)
+
+
+class GalleryIndex:
+    # Common interface of the gallery backends. Vectors are addressed by
+    # caller-chosen integer ids so they can be deleted again later; search
+    # returns (ids, distances) of shape (queries, k) sorted by euclidean
+    # distance, padded with id -1 and distance inf when fewer than k exist.
+    kind = None
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def add(self, ids, vectors):
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def search(self, queries, k=1):
+        raise NotImplementedError
+
+    def state(self):
+        raise NotImplementedError
+
+    @property
+    def nbytes(self):
+        # Memory the index keeps resident for its vectors
+        raise NotImplementedError
+
+    @classmethod
+    def from_state(cls, state):
+        raise NotImplementedError
+
+    def save(self, path, **extra):
+        state = self.state()
+        state["kind"] = np.array(self.kind)
+        for key, value in extra.items():
+            state["extra_" + key] = value
+        with open(path, "wb") as f:
+            np.savez(f, **state)
+
+
+class ExactIndex(GalleryIndex):
+    # Brute-force scan over one contiguous float32 matrix. Removing an id
+    # moves the last row into its slot so the live rows stay contiguous.
+    kind = "exact"
+
+    def __init__(self, capacity=1024):
+        self._matrix = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def vectors(self):
+        return self._matrix[:self.size]
+
+    @property
+    def ids(self):
+        return self._ids[:self.size]
+
+    def _reserve(self, rows):
+        if rows <= len(self._matrix):
+            return
+        capacity = max(rows, 2 * len(self._matrix))
+        for name in ("_matrix", "_sq_norms", "_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, ids, vectors):
+        vectors = _as_queries(vectors)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        start = self.size
+        end = start + len(vectors)
+        self._reserve(end)
+        self._matrix[start:end] = vectors
+        self._sq_norms[start:end] = np.einsum("ij,ij->i", vectors, vectors)
+        self._ids[start:end] = ids
+        for offset, vector_id in enumerate(ids.tolist()):
+            self._rows[vector_id] = start + offset
+        self.size = end
+
+    def remove(self, ids):
+        for vector_id in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            row = self._rows.pop(vector_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._ids[row] = self._ids[last]
+                self._rows[int(self._ids[row])] = row
+            self.size = last
+
+    def search(self, queries, k=1):
+        queries = _as_queries(queries)
+        if self.size == 0 or len(queries) == 0:
+            return _pad_result(len(queries), k)
+        sq_dists = _sq_distances(queries, self.vectors, self._sq_norms[:self.size])
+        cols, top = _top_k(sq_dists, k)
+        ids = np.where(cols >= 0, self._ids[cols], -1)
+        # Rounding can push an exact match's squared distance slightly below 0
+        return ids, np.sqrt(np.maximum(top, 0.0))
+
+    def state(self):
+        return {"ids": self.ids.copy(), "vectors": self.vectors.copy()}
+
+    @property
+    def nbytes(self):
+        return self._matrix.nbytes + self._sq_norms.nbytes + self._ids.nbytes
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls(capacity=max(1024, len(state["ids"])))
+        index.add(state["ids"], state["vectors"])
+        return index
+
+
+class QuantizedIndex(GalleryIndex):
+    # Brute-force scan over a compressed copy of the gallery followed by an
+    # exact re-rank: the scan keeps the k * rerank best rows by approximate
+    # distance and only those are re-scored against the float32 encodings,
+    # so returned distances (and with them the match threshold) are exact.
+    # The codes are what the scan streams through memory; the float32 copy
+    # is only read for the candidates, so it lives in a memory-mapped file
+    # (exact_path, or an anonymous temporary file) and the OS keeps just the
+    # pages re-ranking touches. Subclasses pick the code type.
+    kind = None
+    code_dtype = None
+
+    def __init__(self, rerank=8, exact_path=None, capacity=1024):
+        self.rerank = rerank
+        self.exact_path = exact_path
+        self._codes = np.zeros((capacity, ENCODING_DIM), dtype=self.code_dtype)
+        # Squared norms of the decoded codes, for the approximate distances
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._exact = self._allocate_exact(capacity)
+        self._rows = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def ids(self):
+        return self._ids[:self.size]
+
+    @property
+    def vectors(self):
+        return self._exact[:self.size]
+
+    def encode(self, vectors):
+        raise NotImplementedError
+
+    def decode(self, codes, out=None):
+        # float32 values of the codes, written into `out` when given
+        raise NotImplementedError
+
+    def _allocate_exact(self, capacity):
+        if self.exact_path is None:
+            # Already unlinked, so it goes away with the mapping
+            with tempfile.TemporaryFile() as f:
+                return np.memmap(f, dtype=np.float32, mode="w+", shape=(capacity, ENCODING_DIM))
+        return np.lib.format.open_memmap(self.exact_path, mode="w+", dtype=np.float32,
+                                         shape=(capacity, ENCODING_DIM))
+
+    def _reserve(self, rows):
+        if rows <= len(self._codes):
+            return
+        capacity = max(rows, 2 * len(self._codes))
+        for name in ("_codes", "_sq_norms", "_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        # A memory-mapped file can't grow in place: keep the rows, let go of
+        # the old mapping and map a bigger file over the same path
+        kept = np.array(self._exact[:self.size])
+        self._exact = None
+        self._exact = self._allocate_exact(capacity)
+        self._exact[:self.size] = kept
+
+    def add(self, ids, vectors):
+        vectors = _as_queries(vectors)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        start = self.size
+        end = start + len(vectors)
+        self._reserve(end)
+        codes = self.encode(vectors)
+        decoded = self.decode(codes)
+        self._codes[start:end] = codes
+        self._sq_norms[start:end] = np.einsum("ij,ij->i", decoded, decoded)
+        self._exact[start:end] = vectors
+        self._ids[start:end] = ids
+        for offset, vector_id in enumerate(ids.tolist()):
+            self._rows[vector_id] = start + offset
+        self.size = end
+
+    def remove(self, ids):
+        for vector_id in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            row = self._rows.pop(vector_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                for array in (self._codes, self._sq_norms, self._exact, self._ids):
+                    array[row] = array[last]
+                self._rows[int(self._ids[row])] = row
+            self.size = last
+
+    def _scan(self, queries, candidates):
+        # Rows of the `candidates` smallest approximate distances per query.
+        # Every chunk is decoded into the same small scratch block and scored
+        # into the same distance buffer; numpy has no float16/int8 matrix
+        # product fast enough to skip decoding altogether.
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        chunk = min(SCAN_CHUNK, self.size)
+        scratch = np.empty((chunk, ENCODING_DIM), dtype=np.float32)
+        sq_buffer = np.empty(len(queries) * chunk, dtype=np.float32)
+        best_rows = None
+        best_dists = None
+        for start in range(0, self.size, SCAN_CHUNK):
+            end = min(start + SCAN_CHUNK, self.size)
+            decoded = self.decode(self._codes[start:end], scratch[:end - start])
+            sq_dists = np.matmul(queries, decoded.T,
+                                 out=sq_buffer[:len(queries) * (end - start)].reshape(len(queries), end - start))
+            sq_dists *= -2.0
+            sq_dists += self._sq_norms[start:end]
+            sq_dists += query_sq_norms
+            rows, dists = _top_k(sq_dists, min(candidates, end - start))
+            rows += start
+            if best_rows is not None:
+                rows = np.hstack([best_rows, rows])
+                dists = np.hstack([best_dists, dists])
+                keep, dists = _top_k(dists, min(candidates, rows.shape[1]))
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_rows, best_dists = rows, dists
+        return best_rows
+
+    def search(self, queries, k=1):
+        queries = _as_queries(queries)
+        if self.size == 0 or len(queries) == 0:
+            return _pad_result(len(queries), k)
+        rows = self._scan(queries, max(k, k * self.rerank))
+
+        # Exact distances for the candidates only
+        differences = self._exact[rows] - queries[:, None, :]
+        sq_dists = np.einsum("ijk,ijk->ij", differences, differences)
+        cols, top = _top_k(sq_dists, k)
+        rows = np.take_along_axis(rows, np.maximum(cols, 0), axis=1)
+        ids = np.where(cols >= 0, self._ids[rows], -1)
+        return ids, np.sqrt(np.maximum(top, 0.0))
+
+    def state(self):
+        return {"ids": self.ids.copy(), "vectors": np.array(self.vectors),
+                "params": np.array([self.rerank])}
+
+    @property
+    def nbytes(self):
+        # The memory-mapped float32 copy is paged in and out by the OS
+        return self._codes.nbytes + self._sq_norms.nbytes + self._ids.nbytes
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls(rerank=int(state["params"][0]), capacity=max(1024, len(state["ids"])))
+        index.add(state["ids"], state["vectors"])
+        return index
+
+
+class Float16Index(QuantizedIndex):
+    # Half-precision codes: half the memory of float32, next to no loss
+    kind = "float16"
+    code_dtype = np.float16
+
+    def encode(self, vectors):
+        return vectors.astype(np.float16)
+
+    def decode(self, codes, out=None):
+        if out is None:
+            return codes.astype(np.float32)
+        np.copyto(out, codes)
+        return out
+
+
+class Int8Index(QuantizedIndex):
+    # Scalar-quantized codes on a fixed symmetric grid: a quarter of the
+    # memory of float32
+    kind = "int8"
+    code_dtype = np.int8
+    step = INT8_RANGE / 127
+
+    def encode(self, vectors):
+        return np.clip(np.rint(vectors / self.step), -127, 127).astype(np.int8)
+
+    def decode(self, codes, out=None):
+        if out is None:
+            decoded = codes.astype(np.float32)
+        else:
+            decoded = out
+            np.copyto(decoded, codes)
+        decoded *= self.step
+        return decoded
+
+
+def kmeans(vectors, clusters, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = _as_queries(vectors)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random points instead of losing them
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+def assign(vectors, centroids, chunk=8192):
+    sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        assignment[start:start + chunk] = np.argmin(_sq_distances(block, centroids, sq_norms), axis=1)
+    return assignment
+
+
+class IVFIndex(GalleryIndex):
+    # Inverted-file index: a k-means coarse quantizer splits the gallery into
+    # nlist cells and a query only scans the nprobe cells whose centroids are
+    # closest to it. Raising nprobe trades speed for recall; nprobe == nlist
+    # is an exact scan. Until enough vectors exist to train the quantizer
+    # everything sits in a single exact list.
+    kind = "ivf"
+
+    def __init__(self, nlist=256, nprobe=8, min_train=None, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train if min_train is not None else 32 * nlist
+        self.seed = seed
+        self.centroids = None
+        self._centroid_sq_norms = None
+        self.lists = [ExactIndex(capacity=64)]
+        self._list_of = {}
+
+    def __len__(self):
+        return len(self._list_of)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _all(self):
+        ids = np.concatenate([cell.ids for cell in self.lists])
+        vectors = np.concatenate([cell.vectors for cell in self.lists])
+        return ids, vectors
+
+    def train(self, sample_size=None):
+        # (Re)builds the coarse quantizer from the stored vectors and
+        # redistributes them over the new cells.
+        ids, vectors = self._all()
+        if len(vectors) < self.nlist:
+            return
+        sample_size = sample_size or 64 * self.nlist
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample_size:
+            sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        else:
+            sample = vectors
+        self.centroids = kmeans(sample, self.nlist, seed=self.seed)
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._distribute(ids, vectors)
+
+    def _distribute(self, ids, vectors, assignment=None):
+        if assignment is None:
+            assignment = assign(vectors, self.centroids)
+        self.lists = [ExactIndex(capacity=64) for _ in range(self.nlist)]
+        self._list_of = {}
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        for cell in range(self.nlist):
+            members = order[bounds[cell]:bounds[cell + 1]]
+            if len(members):
+                self.lists[cell].add(ids[members], vectors[members])
+        for vector_id, cell in zip(ids.tolist(), assignment.tolist()):
+            self._list_of[vector_id] = cell
+
+    def add(self, ids, vectors):
+        vectors = _as_queries(vectors)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if not self.trained:
+            self.lists[0].add(ids, vectors)
+            for vector_id in ids.tolist():
+                self._list_of[vector_id] = 0
+            if len(self) >= self.min_train:
+                self.train()
+            return
+        assignment = assign(vectors, self.centroids)
+        for cell in np.unique(assignment).tolist():
+            members = assignment == cell
+            self.lists[cell].add(ids[members], vectors[members])
+        for vector_id, cell in zip(ids.tolist(), assignment.tolist()):
+            self._list_of[vector_id] = cell
+
+    def remove(self, ids):
+        for vector_id in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            cell = self._list_of.pop(vector_id, None)
+            if cell is not None:
+                self.lists[cell].remove([vector_id])
+
+    def search(self, queries, k=1):
+        queries = _as_queries(queries)
+        if len(self) == 0 or len(queries) == 0:
+            return _pad_result(len(queries), k)
+        if not self.trained:
+            return self.lists[0].search(queries, k)
+
+        nprobe = min(self.nprobe, self.nlist)
+        probe_dists = _sq_distances(queries, self.centroids, self._centroid_sq_norms)
+        probes, _ = _top_k(probe_dists, nprobe)
+
+        # Each probed cell is scanned once for all the queries that probe it
+        candidate_ids = [[] for _ in range(len(queries))]
+        candidate_dists = [[] for _ in range(len(queries))]
+        for cell in np.unique(probes).tolist():
+            if len(self.lists[cell]) == 0:
+                continue
+            members = np.flatnonzero((probes == cell).any(axis=1))
+            ids, dists = self.lists[cell].search(queries[members], k)
+            for row, query in enumerate(members.tolist()):
+                candidate_ids[query].append(ids[row])
+                candidate_dists[query].append(dists[row])
+
+        result_ids, result_dists = _pad_result(len(queries), k)
+        for query in range(len(queries)):
+            if not candidate_ids[query]:
+                continue
+            ids = np.concatenate(candidate_ids[query])
+            dists = np.concatenate(candidate_dists[query])
+            order = np.argsort(dists, kind="stable")[:k]
+            result_ids[query, :len(order)] = ids[order]
+            result_dists[query, :len(order)] = dists[order]
+        return result_ids, result_dists
+
+    @property
+    def nbytes(self):
+        return sum(cell.nbytes for cell in self.lists)
+
+    def state(self):
+        ids, vectors = self._all()
+        state = {
+            "ids": ids,
+            "vectors": vectors,
+            "params": np.array([self.nlist, self.nprobe, self.min_train, self.seed]),
+        }
+        if self.trained:
+            state["centroids"] = self.centroids
+            state["assignment"] = np.array([self._list_of[i] for i in ids.tolist()], dtype=np.int64)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        nlist, nprobe, min_train, seed = (int(v) for v in state["params"])
+        index = cls(nlist=nlist, nprobe=nprobe, min_train=min_train, seed=seed)
+        if "centroids" in state:
+            index.centroids = np.asarray(state["centroids"], dtype=np.float32)
+            index._centroid_sq_norms = np.einsum("ij,ij->i", index.centroids, index.centroids)
+            index._distribute(np.asarray(state["ids"]), _as_queries(state["vectors"]), np.asarray(state["assignment"]))
+        else:
+            index.add(state["ids"], state["vectors"])
+        return index
+
+
+INDEX_TYPES = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+    Float16Index.kind: Float16Index,
+    Int8Index.kind: Int8Index,
+}
+
+
+def make_index(kind="exact", **params):
+    try:
+        return INDEX_TYPES[kind](**params)
+    except KeyError:
+        raise ValueError(f"Unknown gallery index '{kind}', expected one of {sorted(INDEX_TYPES)}")
+
+
+def load_index(path):
+    # Returns (index, extra) where extra holds whatever was passed to save()
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    kind = str(state.pop("kind"))
+    extra = {key[len("extra_"):]: state.pop(key) for key in list(state) if key.startswith("extra_")}
+    return INDEX_TYPES[kind].from_state(state), extra
+
+
+def synthetic_gallery(size, identities=None, spread=0.05, seed=0):
+    # Face encodings cluster by identity/demographics rather than filling the
+    # space uniformly; a mixture of gaussians mimics that well enough for
+    # relative recall/latency numbers.
+    rng = np.random.default_rng(seed)
+    identities = identities or max(1, size // 50)
+    centres = rng.normal(scale=0.1, size=(identities, ENCODING_DIM)).astype(np.float32)
+    vectors = centres[rng.integers(identities, size=size)]
+    vectors += rng.normal(scale=spread, size=vectors.shape).astype(np.float32)
+    return vectors
+
+
+def _recall(found, truth, k):
+    recall_1 = float(np.mean(found[:, 0] == truth[:, 0]))
+    recall_k = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())]))
+    return recall_1, recall_k
+
+
+def benchmark(size=100000, queries=200, k=5, nlist=None, nprobes=(1, 4, 16, 64), reranks=(2, 8), seed=0):
+    vectors = synthetic_gallery(size, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(size, queries, replace=False)
+    probe = vectors[picks] + rng.normal(scale=0.02, size=(queries, ENCODING_DIM)).astype(np.float32)
+    ids = np.arange(size)
+    results = []
+
+    exact = ExactIndex(capacity=size)
+    exact.add(ids, vectors)
+    start = time.perf_counter()
+    truth, _ = exact.search(probe, k)
+    elapsed = time.perf_counter() - start
+    results.append({"index": "exact", "recall@1": 1.0, f"recall@{k}": 1.0,
+                    "ms_per_query": 1000 * elapsed / queries, "resident_mb": exact.nbytes / 1e6})
+
+    for index_type in (Float16Index, Int8Index):
+        for rerank in reranks:
+            quantized = index_type(rerank=rerank, capacity=size)
+            quantized.add(ids, vectors)
+            start = time.perf_counter()
+            found, _ = quantized.search(probe, k)
+            elapsed = time.perf_counter() - start
+            recall_1, recall_k = _recall(found, truth, k)
+            results.append({"index": f"{index_type.kind} rerank={rerank}", "recall@1": recall_1,
+                            f"recall@{k}": recall_k, "ms_per_query": 1000 * elapsed / queries,
+                            "resident_mb": quantized.nbytes / 1e6})
+
+    nlist = nlist or max(1, int(4 * np.sqrt(size)))
+    start = time.perf_counter()
+    ivf = IVFIndex(nlist=nlist, min_train=size + 1)
+    ivf.add(ids, vectors)
+    ivf.train()
+    build_s = time.perf_counter() - start
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        found, _ = ivf.search(probe, k)
+        elapsed = time.perf_counter() - start
+        recall_1, recall_k = _recall(found, truth, k)
+        results.append({"index": f"ivf nlist={nlist} nprobe={nprobe}", "recall@1": recall_1,
+                        f"recall@{k}": recall_k, "ms_per_query": 1000 * elapsed / queries,
+                        "resident_mb": ivf.nbytes / 1e6, "build_s": build_s})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark of the gallery indexes")
+    parser.add_argument("--size", type=int, default=100000, help="gallery size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[2, 8],
+                        help="candidates re-ranked per result by the float16/int8 indexes")
+    args = parser.parse_args(argv)
+
+    for row in benchmark(args.size, args.queries, args.k, args.nlist, args.nprobe, args.rerank):
+        print("  ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in row.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import threading
+from concurrent.futures import CancelledError
+
+import numpy as np
+
+from encoding_cache import EncodingCache, encode_photo, read_registry_rows
+from gallery_index import ENCODING_DIM
+from registry import REGISTRY_DB, is_registry_store, open_registry, poll_registry, registry_version
+
+
+class LoadedPhoto:
+    def __init__(self, face_id, name, sha1, vector):
+        self.face_id = face_id
+        self.name = name
+        self.sha1 = sha1
+        self.vector = vector
+
+
+class GalleryReloader:
+    # Keeps a live gallery in step with the registry while the app runs. A
+    # background thread polls the registry's version; when it changes,
+    # photos that are new or whose content changed are encoded (in
+    # `executor` when given, e.g. the pipeline's worker pool, so dlib stays
+    # off this process's GIL) unless the registry store already holds an
+    # encoding for them, the encoding cache is synced, and the
+    # difference is merged into the gallery under `gallery_lock`: removed or
+    # changed photos are evicted and new ones added. Only the merge itself
+    # holds the lock, so frame processing never waits on an encode. Photos
+    # go to the executor one at a time; the background reloads keep at most
+    # `max_in_flight` of them queued, so a large batch of registrations
+    # can't crowd out the frames they share the pool with. A reload called
+    # directly (the initial load) has the whole pool to itself.
+    #
+    # Names of students who gained their first encoding are queued for the
+    # GUI thread (drain_added), which owns the presence tracker.
+    def __init__(self, gallery, registry_path=REGISTRY_DB, cache=None, gallery_lock=None,
+                 executor=None, check_interval=2.0, max_in_flight=1):
+        self.gallery = gallery
+        self.registry_path = registry_path
+        self.cache = cache or EncodingCache()
+        self.gallery_lock = gallery_lock or threading.Lock()
+        self.executor = executor
+        self.check_interval = check_interval
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        # photo path -> LoadedPhoto for everything currently in the gallery
+        self.loaded = {}
+        self._version = None
+        self._added = []
+        self._added_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        poll_registry(self.registry_path, lambda: self.reload(throttle=True), self._stopped, self.check_interval)
+
+    def drain_added(self):
+        with self._added_lock:
+            added, self._added = self._added, []
+            return added
+
+    def reload(self, force=False, throttle=False):
+        # Merges registry changes into the gallery if the file changed since
+        # the last reload; returns (added, removed) photo counts.
+        version = registry_version(self.registry_path)
+        if version == self._version and not force:
+            return 0, 0
+        rows = read_registry_rows(self.registry_path)
+        if not self._encode_uncached(rows, throttle):
+            # The pool is shutting down; sync would encode the rest here
+            return 0, 0
+        self.cache.sync(rows)
+        self._version = version
+
+        wanted = {}
+        for photo_path, entry in self.cache.entries.items():
+            if entry["row"] >= 0:
+                wanted[photo_path] = entry
+        removed = [path for path, photo in self.loaded.items()
+                   if path not in wanted or (wanted[path]["name"], wanted[path]["sha1"]) != (photo.name, photo.sha1)]
+        removed_set = set(removed)
+        added = [path for path in wanted if path not in self.loaded or path in removed_set]
+        if not removed and not added:
+            return 0, 0
+
+        # Copy out of the cache's memory map; the next sync replaces the file
+        vectors = np.array([self.cache.matrix[wanted[path]["row"]] for path in added],
+                           dtype=np.float32).reshape(-1, ENCODING_DIM)
+        names = [wanted[path]["name"] for path in added]
+        known = set(self.gallery.identities)
+        with self.gallery_lock:
+            if removed:
+                self.gallery.remove([self.loaded[path].face_id for path in removed],
+                                    np.array([self.loaded[path].vector for path in removed]))
+            face_ids = self.gallery.add_many(vectors, names) if added else []
+
+        for path in removed:
+            del self.loaded[path]
+        for path, face_id, vector in zip(added, face_ids, vectors):
+            self.loaded[path] = LoadedPhoto(face_id, wanted[path]["name"], wanted[path]["sha1"], vector)
+        new_names = list(dict.fromkeys(name for name in names if name not in known))
+        if new_names:
+            with self._added_lock:
+                self._added.extend(new_names)
+        return len(added), len(removed)
+
+    def _encode_uncached(self, rows, throttle=False):
+        # Takes the photos the cache doesn't have yet from the registry store
+        # or encodes them in the executor, and caches them, so the sync that
+        # follows finds everything cached. Fresh encodings are written back
+        # to the store for the other apps. Returns False if the executor
+        # couldn't take them all.
+        uncached = self.cache.uncached(rows)
+        if not uncached:
+            return True
+
+        store = open_registry(self.registry_path) if is_registry_store(self.registry_path) else None
+        try:
+            # Only for photos never cached; a cached photo whose content
+            # changed may have a stale encoding in the store too
+            new_paths = [photo_path for photo_path, _, _ in uncached if photo_path not in self.cache.entries]
+            stored = store.encodings(new_paths) if store and new_paths else {}
+            if stored:
+                self.cache.add_encodings([row + (stored[row[0]],) for row in uncached if row[0] in stored])
+                uncached = [row for row in uncached if row[0] not in stored]
+            if not uncached or self.executor is None:
+                return True
+            in_flight = self._in_flight if throttle else threading.BoundedSemaphore(len(uncached))
+            futures = []
+            for photo_path, _, _ in uncached:
+                if self._stopped.is_set():
+                    return False
+                in_flight.acquire()
+                try:
+                    future = self.executor.submit(encode_photo, photo_path)
+                except RuntimeError:
+                    in_flight.release()
+                    return False
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+            encodings = []
+            for (photo_path, _, _), future in zip(uncached, futures):
+                try:
+                    encodings.append(future.result())
+                except (OSError, ValueError) as e:
+                    # Cached like a photo without a face until it's replaced
+                    print(f"Could not read photo '{photo_path}': {e}")
+                    encodings.append(None)
+                except (RuntimeError, CancelledError):
+                    return False
+            self.cache.add_encodings([row + (encoding,) for row, encoding in zip(uncached, encodings)])
+            if store:
+                store.set_encodings([(row[0], encoding) for row, encoding in zip(uncached, encodings)
+                                     if encoding is not None])
+            return True
+        finally:
+            if store:
+                store.close()
@@ -0,0 +1,155 @@
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Samples kept per stage; percentiles and rates cover this rolling window
+HISTOGRAM_WINDOW = 1024
+
+
+class RollingHistogram:
+    # Ring buffer of the most recent `window` samples of one stage (seconds)
+    # plus when each was taken, so summaries reflect the last few seconds or
+    # minutes rather than everything since start-up.
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.values = np.zeros(window)
+        self.times = np.zeros(window)
+        self.count = 0
+
+    def record(self, value, now):
+        i = self.count % len(self.values)
+        self.values[i] = value
+        self.times[i] = now
+        self.count += 1
+
+    def summary(self, now):
+        n = min(self.count, len(self.values))
+        if n == 0:
+            return {"count": 0}
+        values = self.values[:n] * 1000
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        span = now - self.times[:n].min()
+        return {
+            "count": self.count,
+            "mean_ms": float(values.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(values.max()),
+            # Samples per second over the window, e.g. FPS for per-frame stages
+            "rate_per_s": n / span if span > 0 else None,
+        }
+
+
+class Metrics:
+    # Stage timers, counters and gauges for the hot path. Recording is a few
+    # array writes under a lock, cheap enough to do on every frame; all the
+    # statistics are computed in snapshot(), which only the metrics endpoint,
+    # the log line and the overlay call.
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.window = window
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        now = time.monotonic()
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.record(seconds, now)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def gauge(self, name, read):
+        # read() is called at snapshot time, for values some other object
+        # already keeps (queue drop counts, disk writes, ...)
+        self._gauges[name] = read
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {name: histogram.summary(now) for name, histogram in self._histograms.items()}
+        for name, read in list(self._gauges.items()):
+            counters[name] = read()
+        return {"uptime_s": now - self.started, "counters": counters, "stages": stages}
+
+    def format_line(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        parts = [f"{name}={value}" for name, value in sorted(snapshot["counters"].items())]
+        for name, stage in sorted(snapshot["stages"].items()):
+            if stage["count"]:
+                parts.append(f"{name}={stage['p50_ms']:.1f}/{stage['p95_ms']:.1f}ms")
+        return " ".join(parts)
+
+
+class MetricsServer:
+    # Serves Metrics.snapshot() as JSON on http://<host>:<port>/metrics.
+    # Binds to localhost by default; the kiosk isn't meant to be scraped
+    # from elsewhere.
+    def __init__(self, metrics, host="127.0.0.1", port=9108):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), indent=2).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsLogger:
+    # Prints Metrics.format_line() every `interval` seconds
+    def __init__(self, metrics, interval=60.0):
+        self.metrics = metrics
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            print(f"[metrics] {self.metrics.format_line()}")
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,444 @@
+import collections
+import multiprocessing
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import face_recognition
+
+from detectors import shared_detector
+from face_quality import assess_face
+from gallery import MATCH_THRESHOLD
+from metrics import Metrics
+from tracking import FaceTracker, iou
+
+
+class LatestQueue:
+    # Bounded queue that never blocks the producer: when it is full the
+    # oldest item is dropped to make room, so consumers always see the
+    # freshest frames instead of an ever-growing backlog.
+    def __init__(self, maxsize=1):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Oldest queued item, or None if nothing arrived within the timeout
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def drain(self):
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            return items
+
+
+def detect_faces(rgb_frame, scale=1.0, detector="hog", detector_options=None):
+    # Face boxes in full-resolution coordinates, detected on a copy of the
+    # frame downscaled by `scale` with one of the backends in detectors.py
+    detector = shared_detector(detector, detector_options)
+    if scale == 1.0:
+        return detector.detect(rgb_frame)
+    small = cv2.resize(rgb_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = rgb_frame.shape[:2]
+    return [
+        (max(int(top / scale), 0), min(int(right / scale), width),
+         min(int(bottom / scale), height), max(int(left / scale), 0))
+        for top, right, bottom, left in detector.detect(small)
+    ]
+
+
+def detect_and_encode(rgb_frame, scale=1.0, detector="hog", detector_options=None):
+    # Runs in the worker pool, possibly in another process, so it only does
+    # the expensive, stateless part; matching happens back in the main
+    # process against the live gallery. Detection runs on a copy downscaled
+    # by `scale`, encoding on the full-resolution crops.
+    face_locations = detect_faces(rgb_frame, scale, detector, detector_options)
+    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    return face_locations, face_encodings
+
+
+def detect_and_encode_timed(frame, scale=1.0, bgr=False, quality_gate=False, known=(), detector="hog",
+                            detector_options=None):
+    # detect_and_encode plus how long each stage took, for the pipeline's
+    # metrics (the worker may be another process, so it can't record them).
+    # With bgr set the frame is converted here, in the worker, rather than
+    # by the dispatch thread before submitting.
+    #
+    # With quality_gate set every face is assessed first (face_quality.py)
+    # and only encoded if it passes and its crop scores higher than the
+    # one behind the tracked identity it overlaps, from `known`:
+    # [(box, quality score), ...]. Faces not encoded get None in place of
+    # an encoding. Returns (locations, encodings, qualities, detect seconds,
+    # quality seconds, encode seconds); qualities are None without the gate.
+    started = time.perf_counter()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if bgr else frame
+    face_locations = detect_faces(rgb_frame, scale, detector, detector_options)
+    detected = time.perf_counter()
+    qualities = [None] * len(face_locations)
+    encode = list(range(len(face_locations)))
+    if quality_gate:
+        qualities = [assess_face(rgb_frame, box) for box in face_locations]
+        encode = [i for i in encode if qualities[i].ok and qualities[i].score > _known_score(face_locations[i], known)]
+    assessed = time.perf_counter()
+    face_encodings = [None] * len(face_locations)
+    for i, encoding in zip(encode, face_recognition.face_encodings(rgb_frame, [face_locations[i] for i in encode])):
+        face_encodings[i] = encoding
+    return (face_locations, face_encodings, qualities,
+            detected - started, assessed - detected, time.perf_counter() - assessed)
+
+
+def _known_score(box, known, iou_threshold=0.3):
+    return max((score for known_box, score in known if iou(known_box, box) >= iou_threshold), default=-1.0)
+
+
+class Frame:
+    def __init__(self, source_id, number, timestamp, image):
+        self.source_id = source_id
+        self.number = number
+        self.timestamp = timestamp
+        self.image = image
+
+
+class FramePool:
+    # Reuses frame buffers instead of allocating a fresh array for every
+    # captured frame. A buffer goes back to the pool when the Frame owning
+    # it is garbage collected, so a frame still waiting in a queue, being
+    # painted or being encoded is never overwritten; consumers must not
+    # hold on to frame.image past the Frame itself. Buffers of an old shape
+    # (the camera changed resolution) are dropped instead of reused.
+    def __init__(self, size=8):
+        self.size = size
+        self.shape = None
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # A free buffer to decode into, or None to let OpenCV allocate one
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return None
+
+    def release(self, buffer):
+        with self._lock:
+            if buffer.shape == self.shape and len(self._free) < self.size:
+                self._free.append(buffer)
+
+    def frame(self, source_id, number, timestamp, image):
+        self.shape = image.shape
+        frame = Frame(source_id, number, timestamp, image)
+        weakref.finalize(frame, self.release, image)
+        return frame
+
+
+class RecognitionResult:
+    def __init__(self, source_id, frame_number, timestamp, faces, detected=True, qualities=None, fresh=None):
+        self.source_id = source_id
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+        # [((top, right, bottom, left), name), ...]; name is None for a face
+        # not recognised yet (no crop passed the quality gate so far)
+        self.faces = faces
+        # False when the boxes were carried forward by the tracker
+        self.detected = detected
+        # Per face, True when its name comes from a match in this very
+        # frame rather than from the tracker; only those count as sightings
+        # towards a student's arrival
+        self.fresh = fresh if fresh is not None else [detected] * len(faces)
+        # FaceQuality of each detected face when the quality gate is on
+        self.qualities = qualities
+
+
+class CaptureThread(threading.Thread):
+    # Reads frames as fast as the camera delivers them and hands each one to
+    # the preview queue and, while recognition is on, to the recognition
+    # queue. Neither put can block, so capture always runs at camera FPS.
+    # With max_fps set, frames beyond the cap are grabbed but never decoded,
+    # which keeps the camera's own buffer from filling up with stale frames.
+    def __init__(self, source_id, video_capture, preview_queue, recognition_queue, recognize,
+                 frame_ready, max_fps=None, metrics=None):
+        super().__init__(daemon=True)
+        self.source_id = source_id
+        self.video_capture = video_capture
+        self.preview_queue = preview_queue
+        self.recognition_queue = recognition_queue
+        self.recognize = recognize
+        self.frame_ready = frame_ready
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.stopped = threading.Event()
+        self.frames_captured = 0
+        # Frames that needed a new buffer because none was free in the pool
+        self.allocations = 0
+        self.frame_pool = FramePool()
+        self.metrics = metrics or Metrics()
+
+    def run(self):
+        next_frame_at = 0.0
+        while not self.stopped.is_set():
+            if not self.video_capture.grab():
+                time.sleep(0.01)
+                continue
+            now = time.time()
+            if now < next_frame_at:
+                continue
+            buffer = self.frame_pool.acquire()
+            with self.metrics.timer("capture"):
+                # Decodes straight into the pooled buffer when its size matches
+                ret, image = self.video_capture.retrieve(buffer)
+            if not ret:
+                continue
+            if image is not buffer:
+                self.allocations += 1
+            next_frame_at = now + self.min_interval
+            self.frames_captured += 1
+            frame = self.frame_pool.frame(self.source_id, self.frames_captured, now, image)
+            self.preview_queue.put(frame)
+            if self.recognize.is_set():
+                self.recognition_queue.put(frame)
+                self.frame_ready.set()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class VideoSource:
+    # Per-camera state. Everything but the capture thread and the queues is
+    # only touched by the pipeline's dispatch thread.
+    def __init__(self, source_id, capture_thread, preview_queue, recognition_queue, tracking_scale, workers):
+        self.id = source_id
+        self.capture_thread = capture_thread
+        self.preview_queue = preview_queue
+        self.recognition_queue = recognition_queue
+        self.tracking_scale = tracking_scale
+        self.detections = LatestQueue(workers)
+        self.reset()
+
+    def reset(self):
+        self.tracker = FaceTracker(scale=self.tracking_scale)
+        self.detections.drain()
+        self.frames_since_detection = 0
+        self.detection_due = True
+
+
+class RecognitionPipeline:
+    # capture threads -> recognition queues -> worker pool -> result queue
+    #                 -> preview queues -------------------------------> GUI
+    # Any number of cameras (add_source) share one pool of detection and
+    # encoding workers and report into one result queue, each result tagged
+    # with its source id. The GUI thread only drains the preview and result
+    # queues; it never waits on a camera or on detection/encoding.
+    #
+    # Full detection + encoding only runs every `detect_every` frames of a
+    # source, or sooner when its tracker loses a face; in between the
+    # tracker moves the last known boxes and names along with the faces.
+    # Sources are visited round-robin, starting one further along each
+    # pass, so a busy camera can't keep the workers to itself.
+    #
+    # With quality_gate set, faces too small, blurred, badly lit or turned
+    # away aren't encoded, and a tracked face that has been matched
+    # `min_matches` times is only encoded again when a crop of it beats the
+    # best one so far; the tracker keeps the identity that best crop gave
+    # (see detect_and_encode_timed, FaceTracker.update). Set min_matches to
+    # the presence tracker's confirmations, which only fresh matches count
+    # towards.
+    #
+    # `detector` and `detector_options` pick the detection backend, see
+    # detectors.py; each worker builds its own on first use.
+    #
+    # Stage timings (capture, track, detect, quality, encode, match,
+    # latency) and counters go to `metrics`; see metrics.py.
+    def __init__(self, gallery, workers=2, use_processes=True, threshold=MATCH_THRESHOLD,
+                 detect_every=5, detection_scale=0.5, tracking_scale=0.5, quality_gate=True,
+                 detector="hog", detector_options=None, min_matches=3, metrics=None):
+        self.gallery = gallery
+        self.gallery_lock = threading.Lock()
+        self.threshold = threshold
+        self.workers = workers
+        self.detect_every = detect_every
+        self.detection_scale = detection_scale
+        self.tracking_scale = tracking_scale
+        self.quality_gate = quality_gate
+        self.min_matches = min_matches
+        self.detector = detector
+        self.detector_options = detector_options or {}
+        # Fails here, rather than in every worker, if the backend can't be built
+        shared_detector(detector, self.detector_options)
+
+        self.sources = []
+        self.result_queue = LatestQueue(64)
+
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("frames_captured",
+                           lambda: sum(s.capture_thread.frames_captured for s in self.sources))
+        # Frames the preview or recognition side skipped to stay current
+        self.metrics.gauge("frames_dropped", lambda: sum(
+            s.preview_queue.dropped + s.recognition_queue.dropped for s in self.sources))
+        self.metrics.gauge("results_dropped", lambda: self.result_queue.dropped)
+        self.metrics.gauge("frame_allocations",
+                           lambda: sum(s.capture_thread.allocations for s in self.sources))
+
+        self.recognize = threading.Event()
+        self.stopped = threading.Event()
+        self._frame_ready = threading.Event()
+        self._reset_sources = threading.Event()
+        self._next_source = 0
+        self._in_flight = threading.BoundedSemaphore(workers)
+        if use_processes:
+            # dlib holds the GIL while it detects and encodes, so worker
+            # threads would stall the GUI; processes sidestep that. Workers
+            # are spawned rather than forked from this multi-threaded process.
+            self.executor = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.dispatch_thread = threading.Thread(target=self._dispatch, daemon=True)
+
+    def add_source(self, source_id, video_capture, max_fps=None):
+        preview_queue = LatestQueue(1)
+        recognition_queue = LatestQueue(1)
+        capture_thread = CaptureThread(source_id, video_capture, preview_queue, recognition_queue,
+                                       self.recognize, self._frame_ready, max_fps, self.metrics)
+        source = VideoSource(source_id, capture_thread, preview_queue, recognition_queue,
+                             self.tracking_scale, self.workers)
+        self.sources.append(source)
+        return source
+
+    def start(self):
+        for source in self.sources:
+            source.capture_thread.start()
+        self.dispatch_thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        for source in self.sources:
+            source.capture_thread.stop()
+        for source in self.sources:
+            source.capture_thread.join(timeout=1)
+        self.dispatch_thread.join(timeout=1)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def set_recognition(self, enabled):
+        if enabled:
+            self.recognize.set()
+        else:
+            self.recognize.clear()
+            for source in self.sources:
+                source.recognition_queue.drain()
+            self._reset_sources.set()
+
+    def _dispatch(self):
+        # Owns the trackers: every frame is tracked here, finished
+        # detections are folded back in, and new detections are handed to a
+        # free worker when one is due.
+        while not self.stopped.is_set():
+            self._frame_ready.wait(0.1)
+            self._frame_ready.clear()
+            if self._reset_sources.is_set():
+                # Recognition was paused; whatever was tracked is stale now
+                self._reset_sources.clear()
+                for source in self.sources:
+                    source.reset()
+            if not self.sources:
+                continue
+            start = self._next_source % len(self.sources)
+            self._next_source = start + 1
+            for source in self.sources[start:] + self.sources[:start]:
+                if not self._process(source):
+                    return
+
+    def _process(self, source):
+        # Returns False once the executor has been shut down
+        frame = source.recognition_queue.get_nowait()
+        if frame is None:
+            return True
+        with self.metrics.timer("track"):
+            gray = source.tracker.prepare(frame.image)
+            lost = source.tracker.track(gray)
+
+        detections = source.detections.drain()
+        for detection in detections:
+            faces = source.tracker.update(gray, detection.faces, detection.qualities)
+            # A face keeps its track's name when it wasn't encoded (None) or
+            # the track holds a name from a better crop
+            detection.fresh = [name is not None and name == tracked_name
+                               for (_, name), (_, tracked_name) in zip(detection.faces, faces)]
+            detection.faces = faces
+            self.result_queue.put(detection)
+
+        source.frames_since_detection += 1
+        if lost or source.frames_since_detection >= self.detect_every:
+            source.detection_due = True
+        if source.detection_due and self._in_flight.acquire(blocking=False):
+            source.detection_due = False
+            source.frames_since_detection = 0
+            try:
+                # The worker converts to RGB itself; `frame` stays referenced
+                # by the callback below, so its buffer isn't reused meanwhile
+                future = self.executor.submit(detect_and_encode_timed, frame.image, self.detection_scale, True,
+                                              self.quality_gate, source.tracker.known(self.min_matches),
+                                              self.detector,
+                                              self.detector_options)
+            except RuntimeError:
+                self._in_flight.release()
+                return False
+            future.add_done_callback(lambda f, source=source, frame=frame: self._finish(source, frame, f))
+        elif source.tracker.tracks and not detections:
+            self.result_queue.put(RecognitionResult(source.id, frame.number, frame.timestamp,
+                                                    source.tracker.faces(), detected=False))
+        return True
+
+    def _finish(self, source, frame, future):
+        self._in_flight.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+        face_locations, face_encodings, qualities, detect_time, quality_time, encode_time = future.result()
+        encoded = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+        started = time.perf_counter()
+        with self.gallery_lock:
+            matched = self.gallery.identify([face_encodings[i] for i in encoded], self.threshold)
+        # None for faces that weren't encoded; the tracker fills those in
+        names = [None] * len(face_locations)
+        for i, name in zip(encoded, matched):
+            names[i] = name
+        metrics = self.metrics
+        metrics.observe("match", time.perf_counter() - started)
+        metrics.observe("detect", detect_time)
+        if self.quality_gate:
+            metrics.observe("quality", quality_time)
+        metrics.observe("encode", encode_time)
+        # From capture to a matched result, including time spent queued
+        metrics.observe("latency", time.time() - frame.timestamp)
+        unknown = matched.count("Unknown")
+        rejected = sum(1 for quality in qualities if quality is not None and not quality.ok)
+        metrics.incr("detections")
+        metrics.incr("faces_detected", len(face_locations))
+        metrics.incr("faces_rejected", rejected)
+        # Passed the gate, but no better than the crop the track already has
+        metrics.incr("encodes_skipped", len(face_locations) - len(encoded) - rejected)
+        metrics.incr("matches", len(matched) - unknown)
+        metrics.incr("unknowns", unknown)
+        source.detections.put(RecognitionResult(source.id, frame.number, frame.timestamp,
+                                                list(zip(face_locations, names)), qualities=qualities))
@@ -0,0 +1,169 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+from attendance_log import ENTRY, REENTRY
+
+UNSEEN = 0
+PRESENT = 1
+EXITED = 2
+
+
+class PresenceTracker:
+    # Per-student presence state machine:
+    #
+    #   UNSEEN --confirmed--> PRESENT --not seen for exit_timeout--> EXITED
+    #                            ^                                     |
+    #                            +-------------confirmed---------------+
+    #
+    # A sighting only counts towards a transition once the student has been
+    # seen in `min_confirmations` frames with gaps no longer than
+    # `confirm_window` seconds, and no student changes state twice within
+    # `cooldown` seconds. Everything else is a no-op, so a student standing
+    # in front of the camera costs one array update per frame.
+    #
+    # State lives in parallel NumPy arrays indexed by student (times are
+    # epoch seconds, NaN when unset) so sweeping for exits is vectorised.
+    def __init__(self, min_confirmations=3, confirm_window=2.0, cooldown=30.0,
+                 exit_timeout=600.0, capacity=256):
+        self.min_confirmations = min_confirmations
+        self.confirm_window = confirm_window
+        self.cooldown = cooldown
+        self.exit_timeout = exit_timeout
+        self.names = []
+        self.index = {}
+        self.size = 0
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.confirmations = np.zeros(capacity, dtype=np.int32)
+        self.last_seen = np.full(capacity, np.nan)
+        self.last_change = np.full(capacity, np.nan)
+        self.entry_time = np.full(capacity, np.nan)
+        self.exit_time = np.full(capacity, np.nan)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, student_name):
+        return student_name in self.index
+
+    def _reserve(self, rows):
+        if rows <= len(self.state):
+            return
+        capacity = max(rows, 2 * len(self.state))
+        for name in ("state", "confirmations", "last_seen", "last_change", "entry_time", "exit_time"):
+            old = getattr(self, name)
+            new = np.full(capacity, np.nan) if old.dtype.kind == "f" else np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, student_name):
+        if student_name in self.index:
+            return self.index[student_name]
+        self._reserve(self.size + 1)
+        i = self.size
+        self.index[student_name] = i
+        self.names.append(student_name)
+        self.size += 1
+        return i
+
+    def observe(self, student_name, now, confirmations=1):
+        # Records a sighting worth `confirmations` confirmations; returns
+        # ENTRY/REENTRY when it changes the student's state, otherwise None.
+        i = self.index.get(student_name)
+        if i is None:
+            return None
+        if not now - self.last_seen[i] <= self.confirm_window:
+            # First sighting, or the last one was too long ago (NaN compares False)
+            self.confirmations[i] = 0
+        self.confirmations[i] += confirmations
+        self.last_seen[i] = now
+
+        state = self.state[i]
+        if state == PRESENT or self.confirmations[i] < self.min_confirmations:
+            return None
+        if now - self.last_change[i] < self.cooldown:
+            return None
+        self.state[i] = PRESENT
+        self.last_change[i] = now
+        self.exit_time[i] = np.nan
+        if state == UNSEEN:
+            self.entry_time[i] = now
+            return ENTRY
+        return REENTRY
+
+    def seen(self, student_name, now):
+        # A sighting that doesn't count towards a transition (the face was
+        # only tracked, not matched again); keeps a present student from
+        # timing out
+        i = self.index.get(student_name)
+        if i is not None and self.state[i] == PRESENT and not self.last_seen[i] >= now:
+            self.last_seen[i] = now
+
+    def sweep(self, now):
+        # Moves everyone not seen for exit_timeout to EXITED and returns their names
+        if self.exit_timeout is None or self.size == 0:
+            return []
+        n = self.size
+        with np.errstate(invalid="ignore"):
+            gone = ((self.state[:n] == PRESENT)
+                    & (now - self.last_seen[:n] > self.exit_timeout)
+                    & ~(now - self.last_change[:n] < self.cooldown))
+        rows = np.flatnonzero(gone)
+        if len(rows) == 0:
+            return []
+        self.state[rows] = EXITED
+        self.last_change[rows] = now
+        # The exit happened when the student was last seen, not when we noticed
+        self.exit_time[rows] = self.last_seen[rows]
+        self.confirmations[rows] = 0
+        return [self.names[i] for i in rows.tolist()]
+
+    def restore(self, student_name, entry_time, exit_time, now=None):
+        # Re-applies an entry/exit logged by an earlier run (datetimes or
+        # None). A student still present counts as seen at `now`, the time of
+        # the restart, so they get the full exit_timeout to show up again.
+        i = self.index.get(student_name)
+        if i is None or entry_time is None:
+            return
+        if now is None:
+            now = time.time()
+        self.entry_time[i] = entry_time.timestamp()
+        self.last_change[i] = now
+        self.last_seen[i] = now
+        self.state[i] = PRESENT
+        if exit_time is not None:
+            self.exit_time[i] = exit_time.timestamp()
+            self.last_change[i] = self.exit_time[i]
+            self.state[i] = EXITED
+
+    def times(self, student_name):
+        # (entry time, exit time) as datetimes, None when unset
+        i = self.index[student_name]
+        return _as_datetime(self.entry_time[i]), _as_datetime(self.exit_time[i])
+
+    def snapshot(self):
+        # Copy of the current state that other threads can read while the
+        # GUI thread keeps updating this tracker
+        n = self.size
+        return PresenceSnapshot(self.names[:n], self.state[:n].copy(),
+                                self.entry_time[:n].copy(), self.exit_time[:n].copy())
+
+
+class PresenceSnapshot:
+    def __init__(self, names, state, entry_time, exit_time):
+        self.names = names
+        self.state = state
+        self.entry_time = entry_time
+        self.exit_time = exit_time
+
+    def rows_in_state(self, state):
+        # (name, entry time, exit time) of everyone in `state`, times as datetimes or None
+        return [(self.names[i], _as_datetime(self.entry_time[i]), _as_datetime(self.exit_time[i]))
+                for i in np.flatnonzero(self.state == state).tolist()]
+
+
+def _as_datetime(timestamp):
+    if np.isnan(timestamp):
+        return None
+    return datetime.fromtimestamp(timestamp)
@@ -0,0 +1,325 @@
+import argparse
+import contextlib
+import csv
+import os
+import pathlib
+import sqlite3
+import sys
+
+import numpy as np
+
+REGISTRY_DB = "RegisteredStudents.db"
+REGISTRY_CSV = "RegisteredStudents.csv"
+REGISTRY_FIELDS = ["ID", "Name", "Course", "Cohort", "PhotoPath"]
+# A student enrolled with several photos has them all in PhotoPath, joined by this
+PHOTO_PATH_SEPARATOR = ";"
+
+
+def split_photo_paths(photo_path):
+    return [path for path in photo_path.split(PHOTO_PATH_SEPARATOR) if path]
+
+
+def join_photo_paths(photo_paths):
+    return PHOTO_PATH_SEPARATOR.join(photo_paths)
+
+
+def is_registry_store(path):
+    return path.endswith(".db")
+
+
+def load_registered_students(csv_file_path):
+    # {student id: {"name", "course", "cohort", "photo_path"}} from
+    # RegisteredStudents.csv, or from the registry store for a .db path
+    if is_registry_store(csv_file_path):
+        with open_registry(csv_file_path) as store:
+            return store.students()
+    students_info = {}
+    if not os.path.exists(csv_file_path):
+        return students_info
+    with open(csv_file_path, "r") as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            student_id = int(row["ID"])
+            students_info[student_id] = {
+                "name": row["Name"],
+                "course": row["Course"],
+                "cohort": row["Cohort"],
+                "photo_path": row["PhotoPath"],
+            }
+    return students_info
+
+
+def save_registered_students(csv_file_path, students_info):
+    # Written next to the real file and renamed over it, so the recognition
+    # app never reads a half-written registry
+    tmp_path = csv_file_path + ".tmp"
+    with open(tmp_path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=REGISTRY_FIELDS)
+
+        writer.writeheader()
+
+        # Write each student's information
+        for student_id, student_info in students_info.items():
+            writer.writerow({
+                "ID": student_id,
+                "Name": student_info["name"],
+                "Course": student_info["course"],
+                "Cohort": student_info["cohort"],
+                "PhotoPath": student_info["photo_path"],
+            })
+    os.replace(tmp_path, csv_file_path)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    course TEXT NOT NULL,
+    cohort TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS students_identity ON students (name, course, cohort);
+CREATE TABLE IF NOT EXISTS photos (
+    student_id INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    encoding BLOB,
+    PRIMARY KEY (student_id, position)
+);
+CREATE INDEX IF NOT EXISTS photos_path ON photos (path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+class DuplicateStudentError(ValueError):
+    pass
+
+
+class RegistryStore:
+    # The student registry as a SQLite database in WAL mode, so the
+    # registration app can insert while the recognition app reads. Students
+    # are looked up by ID or by their (name, course, cohort) through
+    # indexes, and every insert is one transaction instead of a rewrite of
+    # the whole registry. IDs come from AUTOINCREMENT and are never reused,
+    # even after a student is removed. Each photo row can carry the face
+    # encoding computed for it (float32 bytes).
+    #
+    # A counter in the meta table is bumped by every write, so watchers can
+    # tell the registry changed without comparing file times (WAL writes
+    # don't touch the main file's mtime until a checkpoint).
+    def __init__(self, path=REGISTRY_DB, timeout=5.0):
+        self.path = path
+        # Autocommit mode; writes take an explicit BEGIN IMMEDIATE below
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+            self.connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def version(self):
+        return self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def _photo_paths(self, student_ids=None):
+        query = "SELECT student_id, path FROM photos"
+        params = ()
+        if student_ids is not None:
+            query += f" WHERE student_id IN ({','.join('?' * len(student_ids))})"
+            params = tuple(student_ids)
+        photo_paths = {}
+        for student_id, path in self.connection.execute(query + " ORDER BY student_id, position", params):
+            photo_paths.setdefault(student_id, []).append(path)
+        return photo_paths
+
+    def students(self):
+        # {student id: info} in the same shape as load_registered_students
+        photo_paths = self._photo_paths()
+        return {
+            student_id: {
+                "name": name,
+                "course": course,
+                "cohort": cohort,
+                "photo_path": join_photo_paths(photo_paths.get(student_id, [])),
+            }
+            for student_id, name, course, cohort in self.connection.execute(
+                "SELECT id, name, course, cohort FROM students ORDER BY id")
+        }
+
+    def get(self, student_id):
+        row = self.connection.execute(
+            "SELECT name, course, cohort FROM students WHERE id = ?", (student_id,)).fetchone()
+        if row is None:
+            return None
+        name, course, cohort = row
+        photo_paths = self._photo_paths([student_id]).get(student_id, [])
+        return {"name": name, "course": course, "cohort": cohort, "photo_path": join_photo_paths(photo_paths)}
+
+    def find(self, name, course, cohort):
+        # ID of the student with these credentials, or None
+        row = self.connection.execute(
+            "SELECT id FROM students WHERE name = ? AND course = ? AND cohort = ?",
+            (name, course, str(cohort))).fetchone()
+        return row[0] if row else None
+
+    def _insert(self, connection, student, student_id=None):
+        try:
+            cursor = connection.execute(
+                "INSERT INTO students (id, name, course, cohort) VALUES (?, ?, ?, ?)",
+                (student_id, student["name"], student["course"], str(student["cohort"])))
+        except sqlite3.IntegrityError:
+            raise DuplicateStudentError(
+                f"{student['name']} ({student['course']}, cohort {student['cohort']}) is already registered")
+        student_id = cursor.lastrowid
+        encodings = student.get("encodings") or {}
+        connection.executemany(
+            "INSERT INTO photos (student_id, position, path, encoding) VALUES (?, ?, ?, ?)",
+            [(student_id, position, path, _encoding_blob(encodings.get(path)))
+             for position, path in enumerate(split_photo_paths(student["photo_path"]))])
+        return student_id
+
+    def add_student(self, name, course, cohort, photo_path, encodings=None):
+        # Registers one student and returns their new ID. photo_path may
+        # list several photos; encodings optionally maps photo path ->
+        # encoding. Raises DuplicateStudentError for known credentials.
+        return self.add_students([{"name": name, "course": course, "cohort": cohort,
+                                   "photo_path": photo_path, "encodings": encodings}])[0]
+
+    def add_students(self, students):
+        # All or nothing: one transaction for the whole batch
+        with self._transaction() as connection:
+            return [self._insert(connection, student) for student in students]
+
+    def remove_student(self, student_id):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM students WHERE id = ?", (student_id,))
+
+    def photo_rows(self):
+        # (photo path, name, student id) for every photo, like read_registry_rows
+        return [(path, name, str(student_id)) for path, name, student_id in self.connection.execute(
+            "SELECT photos.path, students.name, students.id FROM photos "
+            "JOIN students ON students.id = photos.student_id ORDER BY students.id, photos.position")]
+
+    def encodings(self, paths):
+        # {photo path: encoding} for those of `paths` that have one stored
+        encodings = {}
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            for path, blob in self.connection.execute(
+                    f"SELECT path, encoding FROM photos WHERE encoding IS NOT NULL "
+                    f"AND path IN ({','.join('?' * len(chunk))})", chunk):
+                encodings[path] = np.frombuffer(blob, dtype=np.float32)
+        return encodings
+
+    def set_encodings(self, items):
+        # Stores (photo path, encoding) pairs computed elsewhere
+        with self._transaction() as connection:
+            connection.executemany("UPDATE photos SET encoding = ? WHERE path = ?",
+                                   [(_encoding_blob(encoding), path) for path, encoding in items])
+
+    def import_csv(self, csv_file_path):
+        # Copies a RegisteredStudents.csv in, keeping its IDs; students whose
+        # ID or credentials are already registered are skipped. Returns the
+        # number imported.
+        imported = 0
+        with self._transaction() as connection:
+            for student_id, student in load_registered_students(csv_file_path).items():
+                if connection.execute("SELECT 1 FROM students WHERE id = ?", (student_id,)).fetchone():
+                    continue
+                try:
+                    self._insert(connection, student, student_id)
+                except DuplicateStudentError:
+                    continue
+                imported += 1
+        return imported
+
+    def export_csv(self, csv_file_path):
+        save_registered_students(csv_file_path, self.students())
+
+
+def _encoding_blob(encoding):
+    if encoding is None:
+        return None
+    return np.asarray(encoding, dtype=np.float32).tobytes()
+
+
+def open_registry(path=REGISTRY_DB, csv_file_path=None):
+    # Opens the registry store, first importing the CSV next to it
+    # (RegisteredStudents.db <- RegisteredStudents.csv) when the store is
+    # new, so existing registrations carry over.
+    store = RegistryStore(path)
+    if csv_file_path is None:
+        csv_file_path = os.path.splitext(path)[0] + ".csv"
+    if len(store) == 0 and os.path.exists(csv_file_path):
+        store.import_csv(csv_file_path)
+    return store
+
+
+def registry_version(path):
+    # Changes whenever the registry does; raises OSError if it doesn't exist.
+    # Polled every few seconds, so the store is read through a bare
+    # read-only connection rather than a RegistryStore with its pragmas
+    # and schema check.
+    if is_registry_store(path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        uri = pathlib.Path(path).absolute().as_uri() + "?mode=ro"
+        with contextlib.closing(sqlite3.connect(uri, uri=True)) as connection:
+            return connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+    return os.stat(path).st_mtime
+
+
+def poll_registry(path, refresh, stopped, check_interval):
+    # Body of the threads that follow the registry: calls refresh() every
+    # check_interval seconds until the `stopped` event is set
+    while not stopped.wait(check_interval):
+        try:
+            refresh()
+        except (OSError, KeyError, ValueError, csv.Error, sqlite3.Error) as e:
+            # Caught mid-write by the registration app; try again next tick
+            print(f"Could not reload '{path}': {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export the student registry as CSV")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("csv", help="CSV in the RegisteredStudents.csv layout")
+    parser.add_argument("--db", default=REGISTRY_DB)
+    args = parser.parse_args(argv)
+
+    with RegistryStore(args.db) as store:
+        if args.command == "import":
+            imported = store.import_csv(args.csv)
+            print(f"{imported} students imported into '{args.db}'")
+        else:
+            store.export_csv(args.csv)
+            print(f"{len(store)} students exported to '{args.csv}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
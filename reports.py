@@ -0,0 +1,179 @@
+import csv
+
+from PyQt5 import QtWidgets, QtCore
+
+REPORT_COLUMNS = ["Name", "ID", "Course", "Cohort", "Entry Time", "Exit Time"]
+# Rows handed to the view per fetchMore; the table only asks for more as it scrolls
+FETCH_BATCH = 200
+ALL = "All"
+
+
+def build_report(snapshot, directory, state, course=None, cohort=None):
+    # Rows of the report for everyone in `state`, optionally restricted to a
+    # course and cohort. Reads only the presence snapshot and the student
+    # directory's in-memory indexes, so it is safe to run off the GUI thread.
+    rows = []
+    for name, entry_time, exit_time in snapshot.rows_in_state(state):
+        info = directory.get(name) or {}
+        if course is not None and info.get("course") != course:
+            continue
+        if cohort is not None and info.get("cohort") != cohort:
+            continue
+        rows.append((name, info.get("id", ""), info.get("course", ""), info.get("cohort", ""),
+                     entry_time, exit_time))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def export_report(path, rows):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(REPORT_COLUMNS)
+        for row in rows:
+            writer.writerow([_format_cell(value, "%Y-%m-%d %H:%M:%S") for value in row])
+
+
+def _format_cell(value, time_format="%H:%M:%S"):
+    if value is None:
+        return ""
+    if hasattr(value, "strftime"):
+        return value.strftime(time_format)
+    return str(value)
+
+
+class ReportTableModel(QtCore.QAbstractTableModel):
+    # Holds every row of a report but only exposes them to the view in
+    # batches of FETCH_BATCH as it scrolls (canFetchMore/fetchMore), and
+    # formats a cell only when the view asks for it.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self._loaded = 0
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self._loaded = min(FETCH_BATCH, len(rows))
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(REPORT_COLUMNS)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._loaded < len(self.rows)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self.rows) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        return _format_cell(self.rows[index.row()][index.column()])
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return REPORT_COLUMNS[section]
+        return None
+
+
+class _ReportSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(int, object)
+
+
+class _ReportJob(QtCore.QRunnable):
+    def __init__(self, generation, function, *args):
+        super().__init__()
+        self.generation = generation
+        self.function = function
+        self.args = args
+        self.signals = _ReportSignals()
+
+    def run(self):
+        self.signals.finished.emit(self.generation, self.function(*self.args))
+
+
+class ReportWindow(QtWidgets.QWidget):
+    # A report of every student in one presence state. The rows are built
+    # on Qt's thread pool from a snapshot taken when the window opens (and
+    # again whenever the course/cohort filter changes); results of a filter
+    # that has since been changed again are dropped.
+    def __init__(self, title, snapshot, directory, state, parent=None):
+        super().__init__(parent, QtCore.Qt.Window)
+        self.setWindowTitle(title)
+        self.snapshot = snapshot
+        self.directory = directory
+        self.state = state
+        self._generation = 0
+        self._job = None
+
+        self.course_filter = QtWidgets.QComboBox(self)
+        self.cohort_filter = QtWidgets.QComboBox(self)
+        students = list(directory.by_name.values())
+        self.course_filter.addItems([ALL] + sorted({info["course"] for info in students}))
+        self.cohort_filter.addItems([ALL] + sorted({info["cohort"] for info in students},
+                                                   key=lambda cohort: (len(cohort), cohort)))
+        self.course_filter.currentTextChanged.connect(self.refresh)
+        self.cohort_filter.currentTextChanged.connect(self.refresh)
+
+        self.export_button = QtWidgets.QPushButton("Export CSV", self)
+        self.export_button.clicked.connect(self.export)
+        self.status_label = QtWidgets.QLabel(self)
+
+        self.model = ReportTableModel(self)
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+
+        filters = QtWidgets.QHBoxLayout()
+        filters.addWidget(QtWidgets.QLabel("Course:", self))
+        filters.addWidget(self.course_filter)
+        filters.addWidget(QtWidgets.QLabel("Cohort:", self))
+        filters.addWidget(self.cohort_filter)
+        filters.addStretch()
+        filters.addWidget(self.export_button)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(filters)
+        layout.addWidget(self.table)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+        self.resize(640, 480)
+        self.refresh()
+
+    def _filter_value(self, combo):
+        text = combo.currentText()
+        return None if text == ALL else text
+
+    def refresh(self):
+        self._generation += 1
+        self.status_label.setText("Loading...")
+        self.export_button.setEnabled(False)
+        job = _ReportJob(self._generation, build_report, self.snapshot, self.directory, self.state,
+                         self._filter_value(self.course_filter), self._filter_value(self.cohort_filter))
+        job.signals.finished.connect(self._show_rows)
+        self._job = job
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def _show_rows(self, generation, rows):
+        if generation != self._generation:
+            return
+        self.model.set_rows(rows)
+        self.status_label.setText(f"{len(rows)} students")
+        self.export_button.setEnabled(True)
+
+    def export(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export report", "report.csv", "CSV files (*.csv)")
+        if path:
+            export_report(path, self.model.rows)
@@ -0,0 +1,57 @@
+import threading
+
+from registry import REGISTRY_DB, load_registered_students, poll_registry, registry_version
+
+
+class StudentDirectory:
+    # In-memory copy of the registry (the registry store or
+    # RegisteredStudents.csv) indexed by name and by ID. Lookups are plain
+    # dict reads; a background thread reloads only when the registry's
+    # version changes, and swaps the new indexes in whole so a lookup never
+    # sees a half-loaded directory.
+    def __init__(self, registry_path=REGISTRY_DB, check_interval=2.0):
+        self.registry_path = registry_path
+        self.check_interval = check_interval
+        self.by_name = {}
+        self.by_id = {}
+        self._version = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    def refresh(self):
+        # Reloads the registry if it changed since the last load; returns True if it did
+        try:
+            version = registry_version(self.registry_path)
+        except OSError:
+            return False
+        if version == self._version:
+            return False
+
+        by_name = {}
+        by_id = {}
+        for student_id, student_info in load_registered_students(self.registry_path).items():
+            info = dict(student_info, id=str(student_id))
+            # First student wins, like the linear scan this replaces
+            by_name.setdefault(info["name"], info)
+            by_id[info["id"]] = info
+        self.by_name = by_name
+        self.by_id = by_id
+        self._version = version
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        poll_registry(self.registry_path, self.refresh, self._stopped, self.check_interval)
+
+    def get(self, student_name):
+        return self.by_name.get(student_name)
+
+    def get_by_id(self, student_id):
+        return self.by_id.get(str(student_id))
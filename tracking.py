@@ -0,0 +1,159 @@
+import itertools
+
+import cv2
+import numpy as np
+
+# Boxes everywhere are face_recognition's (top, right, bottom, left) in
+# full-resolution frame coordinates; the tracker itself works on a
+# downscaled grayscale copy of each frame.
+
+
+def iou(a, b):
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    if right <= left or bottom <= top:
+        return 0.0
+    inter = (right - left) * (bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, name):
+        self.id = track_id
+        self.box = np.array(box, dtype=np.float32)
+        self.name = name
+        # Quality score of the crop `name` was recognised from
+        self.quality = 0.0
+        # Detections in a row that matched `name` afresh
+        self.matches = 0
+        self.points = None
+
+    def int_box(self):
+        return tuple(int(round(v)) for v in self.box)
+
+
+class FaceTracker:
+    # Carries face boxes (and the identities attached to them) from one
+    # frame to the next with pyramidal Lucas-Kanade optical flow on a few
+    # corner points inside each box. A track whose points mostly vanish is
+    # dropped and reported as lost so the caller can re-detect.
+    def __init__(self, scale=0.5, iou_threshold=0.3, max_points=30, min_points=5):
+        self.scale = scale
+        self.iou_threshold = iou_threshold
+        self.max_points = max_points
+        self.min_points = min_points
+        self.tracks = []
+        self._prev_gray = None
+        self._ids = itertools.count(1)
+        self._small = None
+        self._gray = [None, None]
+        self._next_gray = 0
+
+    def prepare(self, bgr_frame):
+        # Downscaled grayscale copy the tracker runs on. The buffers are
+        # reused from frame to frame (OpenCV writes into dst when the size
+        # matches); the two gray buffers alternate because the previous
+        # frame's is still needed by the next track().
+        if self.scale != 1.0:
+            self._small = cv2.resize(bgr_frame, None, dst=self._small, fx=self.scale, fy=self.scale,
+                                     interpolation=cv2.INTER_AREA)
+            bgr_frame = self._small
+        i = self._next_gray
+        self._next_gray = 1 - i
+        self._gray[i] = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2GRAY, dst=self._gray[i])
+        return self._gray[i]
+
+    def _seed(self, gray, track):
+        height, width = gray.shape
+        top, right, bottom, left = (track.box * self.scale).astype(int)
+        top, left = max(top, 0), max(left, 0)
+        bottom, right = min(bottom, height), min(right, width)
+        if bottom - top < 4 or right - left < 4:
+            track.points = None
+            return
+        mask = np.zeros_like(gray)
+        mask[top:bottom, left:right] = 255
+        track.points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+
+    def update(self, gray, faces, qualities=None):
+        # Replaces the tracks with a fresh detection, [(box, name), ...],
+        # and returns the tracked faces. Detections overlapping an existing
+        # track keep that track's id. A name of None (the face wasn't
+        # encoded) keeps the track's name; a new track starts out with None,
+        # pending rather than unknown. With `qualities` (FaceQuality per
+        # face) a track also keeps the name from its best-scoring crop
+        # rather than taking one from a poorer crop.
+        remaining = list(self.tracks)
+        tracks = []
+        for (box, name), quality in zip(faces, qualities or [None] * len(faces)):
+            score = quality.score if quality is not None else 0.0
+            best = None
+            best_iou = self.iou_threshold
+            for track in remaining:
+                overlap = iou(track.box, box)
+                if overlap >= best_iou:
+                    best, best_iou = track, overlap
+            if best is None:
+                track = Track(next(self._ids), box, name)
+                track.quality = score if name is not None else 0.0
+                track.matches = 1 if name is not None else 0
+            else:
+                remaining.remove(best)
+                track = best
+                track.box = np.array(box, dtype=np.float32)
+                if name is not None and (track.name in (None, "Unknown") or score >= track.quality):
+                    track.matches = track.matches + 1 if name == track.name else 1
+                    track.name = name
+                    track.quality = score
+                elif name is not None and name == track.name:
+                    track.matches += 1
+            self._seed(gray, track)
+            tracks.append(track)
+        self.tracks = tracks
+        self._prev_gray = gray
+        return self.faces()
+
+    def track(self, gray):
+        # Moves every track to the new frame; returns True if any was lost
+        prev_gray, self._prev_gray = self._prev_gray, gray
+        if prev_gray is None or not self.tracks:
+            return False
+        live = [t for t in self.tracks if t.points is not None and len(t.points) >= self.min_points]
+        lost = len(live) != len(self.tracks)
+        if not live:
+            self.tracks = []
+            return lost
+
+        points = np.concatenate([t.points for t in live])
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None)
+        status = status.reshape(-1).astype(bool)
+
+        tracks = []
+        start = 0
+        for track in live:
+            end = start + len(track.points)
+            good = status[start:end]
+            if good.sum() >= self.min_points:
+                shift = np.median(moved[start:end][good] - points[start:end][good], axis=0).reshape(-1)
+                dx, dy = shift / self.scale
+                track.box += np.array([dy, dx, dy, dx], dtype=np.float32)
+                track.points = moved[start:end][good].reshape(-1, 1, 2)
+                tracks.append(track)
+            else:
+                lost = True
+            start = end
+        self.tracks = tracks
+        return lost
+
+    def faces(self):
+        return [(track.int_box(), track.name) for track in self.tracks]
+
+    def known(self, min_matches=1):
+        # (box, quality score) of every track recognised in at least
+        # `min_matches` detections, for the quality gate
+        return [(track.int_box(), track.quality) for track in self.tracks
+                if track.name not in (None, "Unknown") and track.matches >= min_matches]